@@ -1,12 +1,52 @@
+import os
 import sys
 from http import HTTPStatus
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from fastapi import FastAPI, HTTPException, Request
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 
 sys.path.append("src")
 from api_decorators import construct_response  # noqa: E402
+from data_store import (  # noqa: E402
+    EmissionsStore,
+    StaleCursorError,
+    to_split_dict,
+)
+from emissions_schema import (  # noqa: E402
+    apply_schema,
+    process_technical_efficiency_values,
+)
+from reloader import DatasetReloader  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+from snapshot import (  # noqa: E402
+    CSV_PATH,
+    SNAPSHOT_PATH,
+    dataset_version,
+    load_snapshot,
+)
+from streaming import negotiate_stream_format, stream_response  # noqa: E402
+
+MAX_PAGE_SIZE = 10000
+# Threads running the sync endpoints, the streamed exports have their own pool in streaming.py
+API_THREADS = int(os.environ.get("API_THREADS", 16))
+EMISSIONS_COLUMNS = ["Total CO₂ emissions [m tonnes]", "Reporting Period", "IMO Number"]
+FUEL_COLUMNS = ["Total fuel consumption [m tonnes]", "Reporting Period", "IMO Number"]
+VERIFIER_COLUMNS = [
+    "Verifier Name",
+    "Verifier NAB",
+    "Verifier Address",
+    "Verifier City",
+    "Verifier Accreditation number",
+    "Verifier Country",
+]
+
+response_cache = ResponseCache(
+    maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+    max_age=int(os.environ.get("RESPONSE_CACHE_MAX_AGE", 300)),
+)
 
 # Define application
 app = FastAPI(
@@ -15,18 +55,122 @@ app = FastAPI(
     version="0.1",
 )
 
+store = None
+
+
+def _dataset_path() -> str:
+    """The memory-mapped Arrow snapshot is used when it exists, otherwise we fall back to the csv"""
+    return SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else CSV_PATH
+
+
+def _build_store() -> EmissionsStore:
+    """Read the ship data from all the years we have downloaded and index it.
+    The snapshot already holds the canonical types of emissions_schema, the csv is converted here
+    """
+    path = _dataset_path()
+    version = dataset_version(path)
+    if path == SNAPSHOT_PATH:
+        df = load_snapshot(path)
+    else:
+        df = apply_schema(process_technical_efficiency_values(pd.read_csv(path)))
+
+    return EmissionsStore(df, version=version)
+
+
+def _swap_store(new_store: EmissionsStore):
+    """Makes a new store visible to the requests that start from now on.
+    The store is replaced before the cache version, so a request that sees the new cache version
+    always reads the new store and no old body can be cached under the new version
+    """
+    global store
+    store = new_store
+    response_cache.set_version(new_store.version)
+
+
+reloader = DatasetReloader(
+    load=_build_store,
+    swap=_swap_store,
+    current_version=lambda: dataset_version(_dataset_path()),
+    interval=float(os.environ.get("DATASET_RELOAD_INTERVAL", 30)),
+    # touched by /admin/reload so every worker reloads, not only the one that got the request
+    marker=os.environ.get(
+        "DATASET_RELOAD_MARKER", os.path.join(os.path.dirname(SNAPSHOT_PATH), "reload.marker")
+    ),
+)
+
+
+def load_dataset():
+    """Load the dataset if it is not loaded yet. Gunicorn calls it in the master process before
+    forking the workers, see app/gunicorn.py. The version of the file keys the response cache
+    """
+    if store is None:
+        _swap_store(_build_store())
+
 
 @app.on_event("startup")
 def load_artifacts():
-    """Read the csv with all the ship data from all the years we have downloaded"""
-    global df
-    df = pd.read_csv("data/interim/ship_emissions_tracker_2018_2021.csv")
+    """Load the dataset, bound the worker threads and start watching the file for new versions
+
+    A worker forked by gunicorn to replace a recycled one inherits the store the master loaded at
+    boot, it loads the current version before serving when the file changed since then
+    """
+    load_dataset()
+    if dataset_version(_dataset_path()) != store.version:
+        reloader.reload()
+    current_default_thread_limiter().total_tokens = API_THREADS
+    reloader.start(version=store.version)
+
+
+@app.on_event("shutdown")
+def stop_reloader():
+    reloader.stop()
+
+
+def _page(
+    current: EmissionsStore,
+    positions: np.ndarray,
+    columns: List[str],
+    fields: Optional[str],
+    limit: Optional[int],
+    cursor: Optional[str],
+) -> Tuple[np.ndarray, List[str], Optional[str]]:
+    """Gets the positions of a page of rows for a collection endpoint and the fields to return
+
+    Args:
+        current (EmissionsStore): the store the request started with
+        positions (np.ndarray): the row positions of the collection taken from the store indexes
+        columns (List[str]): the columns the endpoint exposes
+        fields (Optional[str]): comma separated subset of the columns, all of them if None
+        limit (Optional[int]): the size of the page, the whole collection if None
+        cursor (Optional[str]): the cursor returned with the previous page
+
+    Returns:
+        Tuple[np.ndarray, List[str], Optional[str]]: the positions of the rows of the page, the
+        columns to return and the cursor of the next page
+    """
+    if fields is not None:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        if not requested or not set(requested).issubset(columns):
+            raise HTTPException(status_code=400, detail="The fields requested are not correct")
+        columns = requested
+
+    try:
+        page_positions, next_cursor = current.page_positions(positions, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="The cursor provided is not correct")
+    except StaleCursorError:
+        raise HTTPException(
+            status_code=410,
+            detail="The dataset was reloaded since the cursor was given, start from the first page",
+        )
+
+    return page_positions, columns, next_cursor
 
 
 @app.get("/", tags=["General"])
 @construct_response
-def _index(request: Request) -> Dict:
-    """Health check."""
+async def _index(request: Request) -> Dict:
+    """Health check. It runs on the event loop so it never waits behind the worker threads"""
     response = {
         "message": HTTPStatus.OK.phrase,
         "status-code": HTTPStatus.OK,
@@ -35,7 +179,41 @@ def _index(request: Request) -> Dict:
     return response
 
 
+@app.get("/cache_stats", tags=["General"])
+@construct_response
+def _cache_stats(request: Request) -> Dict:
+    """Returns the hit, miss and eviction counters of the response cache"""
+    response = {
+        "message": HTTPStatus.OK.phrase,
+        "status-code": HTTPStatus.OK,
+        "data": response_cache.stats(),
+    }
+    return response
+
+
+@app.post("/admin/reload", tags=["General"])
+@construct_response
+def _reload_dataset(request: Request, x_admin_token: Optional[str] = Header(None)) -> Dict:
+    """Asks the background reloaders of all the workers to load the dataset again and swap it in.
+    The endpoint is only enabled when the ADMIN_TOKEN environment variable is set and the request
+    sends the same value in the X-Admin-Token header
+    """
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token or x_admin_token != admin_token:
+        raise HTTPException(status_code=403, detail="Not allowed to reload the dataset")
+
+    reloader.trigger()
+
+    response = {
+        "message": HTTPStatus.ACCEPTED.phrase,
+        "status-code": HTTPStatus.ACCEPTED,
+        "data": {"version": store.version},
+    }
+    return response
+
+
 @app.get("/ships", tags=["Ship Types"])
+@response_cache.cached
 @construct_response
 def _get_ships(request: Request) -> Dict:
     """
@@ -43,8 +221,9 @@ def _get_ships(request: Request) -> Dict:
     Returns:
         List: Returns a list of ship types available in the dataset
     """
+    current = store
 
-    data = {"ships": list(df["Ship type"].unique())}
+    data = {"ships": current.ship_types}
 
     response = {
         "message": HTTPStatus.OK.phrase,
@@ -56,18 +235,41 @@ def _get_ships(request: Request) -> Dict:
 
 
 @app.get("/ships/{ship_id}", tags=["Ship specific data"])
+@response_cache.cached
 @construct_response
-def _get_ship_data(request: Request, ship_id: int) -> Dict:
+def _get_ship_data(
+    request: Request,
+    ship_id: int,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+) -> Dict:
     """
     The ship id is the IMO Number which is a unique identifier for a vessel. This function returns all the
     data related to a vessel for all the reporting years
     Returns:
         Dict: Returns a dictionary in the form dict like {‘index’ -> [index], ‘columns’ -> [columns], ‘data’ -> [values]}
-        I thought this way will be easier to convert this dictionary back to a Pandas DataFrame
+        I thought this way will be easier to convert this dictionary back to a Pandas DataFrame.
+        Missing values are returned as null.
+        The rows can be paged with limit and cursor and projected with a comma separated list of fields
     """
-
-    if ship_id in df["IMO Number"].unique():
-        data = df[df["IMO Number"] == ship_id].fillna("Missing").to_dict(orient="split")
+    current = store
+
+    if current.has_ship(ship_id):
+        positions, columns, next_cursor = _page(
+            current,
+            current.ship_positions(ship_id),
+            list(current.df.columns),
+            fields,
+            limit,
+            cursor,
+        )
+        media_type = negotiate_stream_format(request.headers.get("accept"))
+        if media_type is not None:
+            return stream_response(current, media_type, positions, columns, next_cursor)
+
+        data = to_split_dict(current.rows(positions, columns))
+        data["next_cursor"] = next_cursor
 
         response = {
             "message": HTTPStatus.OK.phrase,
@@ -81,23 +283,45 @@ def _get_ship_data(request: Request, ship_id: int) -> Dict:
 
 
 @app.get("/emissions/{ship_type}", tags=["Ship type emissions"])
+@response_cache.cached
 @construct_response
-def _emissions_by_ship(request: Request, ship_type: str) -> Dict:
+def _emissions_by_ship(
+    request: Request,
+    ship_type: str,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+) -> Dict:
     """
     This function takes a ship type as parameter and returns all the emissions created by it.
     Args:
         request (Request): object that gives access to the request method and url
         ship_type (str): the ship type like Bulk carrier, Container ship etc.
+        fields (Optional[str]): comma separated subset of the columns to return
+        limit (Optional[int]): the number of rows in a page, all the rows if not provided
+        cursor (Optional[str]): the next_cursor returned with the previous page
 
     Returns:
         Dict: Returns a dictionary in the form dict like {‘index’ -> [index], ‘columns’ -> [columns], ‘data’ -> [values]}
         the columns are the total CO2 emissions, the reporting period and the id of the vessel
     """
-
-    if ship_type in df["Ship type"].unique():
-        data = df[df["Ship type"] == ship_type][
-            ["Total CO₂ emissions [m tonnes]", "Reporting Period", "IMO Number"]
-        ].to_dict(orient="split")
+    current = store
+
+    if current.has_ship_type(ship_type):
+        positions, columns, next_cursor = _page(
+            current,
+            current.ship_type_positions(ship_type),
+            EMISSIONS_COLUMNS,
+            fields,
+            limit,
+            cursor,
+        )
+        media_type = negotiate_stream_format(request.headers.get("accept"))
+        if media_type is not None:
+            return stream_response(current, media_type, positions, columns, next_cursor)
+
+        data = to_split_dict(current.rows(positions, columns))
+        data["next_cursor"] = next_cursor
 
         response = {
             "message": HTTPStatus.OK.phrase,
@@ -111,23 +335,100 @@ def _emissions_by_ship(request: Request, ship_type: str) -> Dict:
 
 
 @app.get("/fuel_consumption/{ship_type}", tags=["Ship type fuel consumption"])
+@response_cache.cached
 @construct_response
-def _fuel_by_ship(request: Request, ship_type: str) -> Dict:
+def _fuel_by_ship(
+    request: Request,
+    ship_type: str,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+) -> Dict:
     """Function returns the fuel consumption and reporting period for all the vessels belonging to a specific category
 
     Args:
         request (Request): object that gives access to the request method and url
         ship_type (str): the ship type like Bulk carrier, Container ship etc.
+        fields (Optional[str]): comma separated subset of the columns to return
+        limit (Optional[int]): the number of rows in a page, all the rows if not provided
+        cursor (Optional[str]): the next_cursor returned with the previous page
 
     Returns:
         Dict: Returns a dictionary in the form dict like {‘index’ -> [index], ‘columns’ -> [columns], ‘data’ -> [values]}
         the columns are the total CO2 emissions, the reporting period and the id of the vessel
     """
+    current = store
+
+    if current.has_ship_type(ship_type):
+        positions, columns, next_cursor = _page(
+            current, current.ship_type_positions(ship_type), FUEL_COLUMNS, fields, limit, cursor
+        )
+        media_type = negotiate_stream_format(request.headers.get("accept"))
+        if media_type is not None:
+            return stream_response(current, media_type, positions, columns, next_cursor)
+
+        data = to_split_dict(current.rows(positions, columns))
+        data["next_cursor"] = next_cursor
+
+        response = {
+            "message": HTTPStatus.OK.phrase,
+            "status-code": HTTPStatus.OK,
+            "data": data,
+        }
+
+        return response
+    else:
+        raise HTTPException(status_code=404, detail="The argument provided is not correct")
+
+
+@app.get("/emissions/{ship_type}/summary", tags=["Ship type emissions"])
+@response_cache.cached
+@construct_response
+def _emissions_summary_by_ship(request: Request, ship_type: str) -> Dict:
+    """Returns the count, sum, mean and quantiles of the total CO₂ emissions of a ship type for
+    every reporting period. The numbers are computed once when the dataset is loaded
+
+    Args:
+        request (Request): object that gives access to the request method and url
+        ship_type (str): the ship type like Bulk carrier, Container ship etc.
+
+    Returns:
+        Dict: Returns a dictionary with a list of records, one for each reporting period
+    """
+    current = store
 
-    if ship_type in df["Ship type"].unique():
-        data = df[df["Ship type"] == ship_type][
-            ["Total fuel consumption [m tonnes]", "Reporting Period", "IMO Number"]
-        ].to_dict(orient="split")
+    if current.has_ship_type(ship_type):
+        data = {"summary": current.summary("emissions", ship_type)}
+
+        response = {
+            "message": HTTPStatus.OK.phrase,
+            "status-code": HTTPStatus.OK,
+            "data": data,
+        }
+
+        return response
+    else:
+        raise HTTPException(status_code=404, detail="The argument provided is not correct")
+
+
+@app.get("/fuel_consumption/{ship_type}/summary", tags=["Ship type fuel consumption"])
+@response_cache.cached
+@construct_response
+def _fuel_summary_by_ship(request: Request, ship_type: str) -> Dict:
+    """Returns the count, sum, mean and quantiles of the total fuel consumption of a ship type for
+    every reporting period. The numbers are computed once when the dataset is loaded
+
+    Args:
+        request (Request): object that gives access to the request method and url
+        ship_type (str): the ship type like Bulk carrier, Container ship etc.
+
+    Returns:
+        Dict: Returns a dictionary with a list of records, one for each reporting period
+    """
+    current = store
+
+    if current.has_ship_type(ship_type):
+        data = {"summary": current.summary("fuel_consumption", ship_type)}
 
         response = {
             "message": HTTPStatus.OK.phrase,
@@ -141,27 +442,36 @@ def _fuel_by_ship(request: Request, ship_type: str) -> Dict:
 
 
 @app.get("/verifier_info", tags=["Info"])
+@response_cache.cached
 @construct_response
-def _get_verifier_info(request: Request) -> Dict:
+def _get_verifier_info(
+    request: Request,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+) -> Dict:
     """Returns all the verifier info for all the vessels across all periods
 
     Args:
         request (Request): object that gives access to the request method and url
+        fields (Optional[str]): comma separated subset of the columns to return
+        limit (Optional[int]): the number of rows in a page, all the rows if not provided
+        cursor (Optional[str]): the next_cursor returned with the previous page
 
     Returns:
         Dict: Returns a dictionary in the form dict like {‘index’ -> [index], ‘columns’ -> [columns], ‘data’ -> [values]}
         the columns are the verifier name, NAB, address, city, accreditation number and country
     """
-    data = df[
-        [
-            "Verifier Name",
-            "Verifier NAB",
-            "Verifier Address",
-            "Verifier City",
-            "Verifier Accreditation number",
-            "Verifier Country",
-        ]
-    ].to_dict(orient="split")
+    current = store
+    positions, columns, next_cursor = _page(
+        current, current.all_positions, VERIFIER_COLUMNS, fields, limit, cursor
+    )
+    media_type = negotiate_stream_format(request.headers.get("accept"))
+    if media_type is not None:
+        return stream_response(current, media_type, positions, columns, next_cursor)
+
+    data = to_split_dict(current.rows(positions, columns))
+    data["next_cursor"] = next_cursor
 
     response = {
         "message": HTTPStatus.OK.phrase,
@@ -173,6 +483,7 @@ def _get_verifier_info(request: Request) -> Dict:
 
 
 @app.get("/technical_efficiency/{ship_id}", tags=["Technical efficiency of a vessel"])
+@response_cache.cached
 @construct_response
 def _efficiency_by_ship(request: Request, ship_id: int) -> Dict:
     """Function returns the technical efficiency type and value for a specific ship
@@ -182,12 +493,19 @@ def _efficiency_by_ship(request: Request, ship_id: int) -> Dict:
         ship_id (int): the id of a ship
 
     Returns:
-        Dict: Returns a dictionary with the type and gCO₂/t·nm values
+        Dict: Returns a dictionary with the type and gCO₂/t·nm values, they are null when the
+        technical efficiency is not applicable or missing
     """
-
-    if ship_id in df["IMO Number"].unique():
-        val = df.loc[df[df["IMO Number"] == ship_id].index[0], "Technical efficiency"]
-        data = {"type": val.split()[0], "gCO₂/t·nm": val.split()[1].removeprefix("(")}
+    current = store
+
+    if current.has_ship(ship_id):
+        position = current.ship_positions(ship_id)[0]
+        efficiency_type = current.df.at[position, "technical_efficiency_type"]
+        efficiency_value = current.df.at[position, "technical_efficiency_value"]
+        data = {
+            "type": None if pd.isna(efficiency_type) else efficiency_type,
+            "gCO₂/t·nm": None if pd.isna(efficiency_value) else str(efficiency_value),
+        }
 
         response = {
             "message": HTTPStatus.OK.phrase,
@@ -0,0 +1,37 @@
+"""Gunicorn configuration of the API
+
+Run from the base directory with: gunicorn -c app/gunicorn.py app.api:app
+Every setting can be overridden with the environment variables read below.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:80")
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The endpoints are CPU bound pandas work, more workers than cores only adds context switches
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+
+# Import the app and load the dataset in the master (see when_ready), the workers are forked
+# afterwards and share the pages of the dataset copy-on-write instead of loading one copy each
+preload_app = True
+
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# Recycle the workers from time to time, a new worker is forked from the preloaded master so it
+# starts without loading the dataset again
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    """Loads the dataset in the master process once, before the first worker is forked"""
+    from app import api
+
+    server.log.info("Loading the dataset before forking the workers")
+    api.load_dataset()
@@ -0,0 +1,98 @@
+"""Compares the peak memory of the RDS loader reading the whole csv (before) and reading it in
+column-projected chunks (after), for csv files of growing size. Every run happens in a new
+process, so its peak RSS only counts that run, and writes to an SQLite file like the Lambda
+writes to RDS.
+
+Run from the base directory: python benchmarks/rds_loader_memory_benchmark.py
+"""
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("src")
+from rds_bulk_loader import (  # noqa: E402
+    EMISSIONS_COLUMNS,
+    ensure_emissions_table,
+    load_frames,
+    read_csv_chunks,
+)
+
+ROWS = (50_000, 100_000, 200_000, 400_000)
+# the csv of a year has about 60 columns, most of them are not loaded
+EXTRA_COLUMNS = 55
+
+
+def write_csv(path: str, rows: int):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "IMO Number": np.arange(rows),
+            "Ship type": rng.choice(["Bulk carrier", "Oil tanker", "Container ship"], rows),
+            "Total CO₂ emissions [m tonnes]": rng.random(rows) * 1e4,
+            "Reporting Period": 2021,
+            "Total fuel consumption [m tonnes]": rng.random(rows) * 1e3,
+        }
+    )
+    for i in range(EXTRA_COLUMNS):
+        df[f"Other column {i} [m tonnes]"] = rng.random(rows)
+    df.to_csv(path, index=False)
+
+
+def load_before(path: str, conn):
+    df = pd.read_csv(path)
+    return load_frames(conn, [df[list(EMISSIONS_COLUMNS.values())]])
+
+
+def load_after(path: str, conn):
+    return load_frames(conn, read_csv_chunks(path))
+
+
+def peak_rss() -> float:
+    """The peak RSS of the process in MB. VmHWM is reset when the process is exec'ed, unlike
+    ru_maxrss which keeps the RSS the parent had when it forked the child
+    """
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode: str, path: str, database: str) -> float:
+    """Loads the csv into a new database and returns the peak RSS of the process in MB"""
+    conn = sqlite3.connect(database)
+    ensure_emissions_table(conn)
+    (load_before if mode == "before" else load_after)(path, conn)
+    conn.close()
+    return peak_rss()
+
+
+def main():
+    context = get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in ROWS:
+            path = os.path.join(directory, f"{rows}.csv")
+            write_csv(path, rows)
+            size = os.path.getsize(path) / 1e6
+
+            peaks = {}
+            for mode in ("before", "after"):
+                database = os.path.join(directory, f"{rows}-{mode}.sqlite")
+                with context.Pool(1, maxtasksperchild=1) as pool:
+                    peaks[mode] = pool.apply(run, (mode, path, database))
+
+            print(
+                f"{rows} rows, {size:.0f} MB csv: peak RSS before {peaks['before']:.0f} MB, "
+                f"after {peaks['after']:.0f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compares the time to encode the largest API payloads with the FastAPI default path
+(jsonable_encoder + json.dumps) and with the orjson path used by construct_response.
+
+Run from the base directory: python benchmarks/serialization_benchmark.py
+"""
+import json
+import os
+import sys
+import timeit
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+sys.path.append("src")
+from api_decorators import render_json  # noqa: E402
+from data_store import EmissionsStore, to_split_dict  # noqa: E402
+from snapshot import CSV_PATH, SNAPSHOT_PATH, load_snapshot  # noqa: E402
+
+VERIFIER_COLUMNS = [
+    "Verifier Name",
+    "Verifier NAB",
+    "Verifier Address",
+    "Verifier City",
+    "Verifier Accreditation number",
+    "Verifier Country",
+]
+EMISSIONS_COLUMNS = ["Total CO₂ emissions [m tonnes]", "Reporting Period", "IMO Number"]
+
+
+def encode_before(frame: pd.DataFrame) -> bytes:
+    data = frame.astype(object).fillna("Missing").to_dict(orient="split")
+    return json.dumps(jsonable_encoder({"data": data}), ensure_ascii=False).encode()
+
+
+def encode_after(frame: pd.DataFrame) -> bytes:
+    return render_json({"data": to_split_dict(frame)})
+
+
+def main(repeat: int = 5):
+    df = load_snapshot(SNAPSHOT_PATH) if os.path.exists(SNAPSHOT_PATH) else pd.read_csv(CSV_PATH)
+    store = EmissionsStore(df)
+
+    largest_ship_type = max(store.ship_types, key=lambda t: len(store.ship_type_positions(t)))
+    payloads = {
+        "/verifier_info": store.rows(store.all_positions, VERIFIER_COLUMNS),
+        f"/emissions/{largest_ship_type}": store.rows(
+            store.ship_type_positions(largest_ship_type), EMISSIONS_COLUMNS
+        ),
+    }
+
+    for endpoint, frame in payloads.items():
+        before = min(timeit.repeat(lambda: encode_before(frame), number=1, repeat=repeat))
+        after = min(timeit.repeat(lambda: encode_after(frame), number=1, repeat=repeat))
+        print(
+            f"{endpoint}: {len(frame)} rows, {len(encode_after(frame)) / 1e6:.2f} MB, "
+            f"before {before * 1000:.1f} ms, after {after * 1000:.1f} ms, "
+            f"speedup {before / after:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
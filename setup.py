@@ -11,6 +11,7 @@ with open(Path(BASE_DIR, "requirements.txt"), "r") as file:
 
 # setup.py
 style_packages = ["black==22.3.0", "flake8==3.9.2", "isort==5.10.1"]
+test_packages = ["pytest==7.4.3", "httpx==0.25.2", "moto[s3]==4.2.14"]
 
 # setup.py
 setup(
@@ -20,5 +21,8 @@ setup(
     python_requires=">=3.7",
     packages=find_namespace_packages(),
     install_requires=[required_packages],
-    extras_require={"dev": style_packages + ["pre-commit==3.3.2"]},
+    extras_require={
+        "dev": style_packages + test_packages + ["pre-commit==3.3.2"],
+        "test": test_packages,
+    },
 )
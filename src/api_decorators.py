@@ -1,25 +1,114 @@
+import inspect
 from datetime import datetime
 from functools import wraps
-from typing import Dict
+from http import HTTPStatus
+from typing import Any, Optional
+from urllib.parse import quote
 
-from fastapi import Request
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Request, Response
 
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
 
-def construct_response(f):
-    """Construct a JSON response for an endpoint."""
 
-    @wraps(f)
-    def wrap(request: Request, *args, **kwargs) -> Dict:
-        results = f(request, *args, **kwargs)
-        response = {
-            "message": results["message"],
+def _default(obj: Any) -> Any:
+    """Serializes the values orjson does not know about, mostly pandas and numpy scalars"""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def render_json(content: Any) -> bytes:
+    """Renders the content to JSON bytes, NaN values become null"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def render_envelope(
+    request: Request, message: str, status_code: int, data: Optional[bytes] = None
+) -> bytes:
+    """Renders the envelope of a response around its data, already rendered to JSON, so the same
+    data can be sent with the timestamp and the url of every request it answers
+    """
+    envelope = render_json(
+        {
+            "message": message,
             "method": request.method,
-            "status-code": results["status-code"],
+            "status-code": status_code,
             "timestamp": datetime.now().isoformat(),
             "url": request.url._url,
         }
-        if "data" in results:
-            response["data"] = results["data"]
-        return response
+    )
+    if data is None:
+        return envelope
+
+    return envelope[:-1] + b',"data":' + data + b"}"
+
+
+class EnvelopeResponse(Response):
+    """The JSON response built by construct_response, it keeps the message and the rendered data
+    so the response cache can wrap them in the envelope of another request
+    """
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        request: Request,
+        message: str,
+        status_code: int,
+        data: Optional[bytes] = None,
+        headers: Optional[dict] = None,
+    ):
+        self.message = message
+        self.data = data
+        super().__init__(
+            content=render_envelope(request, message, status_code, data),
+            status_code=status_code,
+            headers=headers,
+        )
+
+
+def _render(request: Request, results) -> Response:
+    """Turns what an endpoint returned into the Response sent to the client"""
+    if isinstance(results, Response):
+        results.headers.update(
+            {
+                "X-Message": HTTPStatus(results.status_code).phrase,
+                "X-Method": request.method,
+                "X-Status-Code": str(results.status_code),
+                "X-Timestamp": datetime.now().isoformat(),
+                "X-Url": quote(request.url._url, safe=":/?&=%#"),
+            }
+        )
+        return results
+
+    data = render_json(results["data"]) if "data" in results else None
+    return EnvelopeResponse(request, results["message"], results["status-code"], data)
+
+
+def construct_response(f):
+    """Construct a JSON response for an endpoint.
+    The envelope is rendered to bytes with orjson and returned as a Response, so FastAPI does not
+    walk the data again with jsonable_encoder. Endpoints that stream their rows return a Response
+    instead of a dict, in that case the metadata of the envelope is sent in the headers.
+    """
+
+    if inspect.iscoroutinefunction(f):
+
+        @wraps(f)
+        async def async_wrap(request: Request, *args, **kwargs) -> Response:
+            return _render(request, await f(request, *args, **kwargs))
+
+        return async_wrap
+
+    @wraps(f)
+    def wrap(request: Request, *args, **kwargs) -> Response:
+        return _render(request, f(request, *args, **kwargs))
 
     return wrap
@@ -3,15 +3,20 @@ import os
 import re
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
 import pandas as pd
-from botocore.exceptions import ClientError
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
+import s3_transfer
+from ingestion_manifest import IngestionManifest
+from mrv_http_client import MRVHttpClient
+from s3_transfer import create_s3_client
+from xlsx_stream import file_sha256
+
 LOG_FORMAT = "%(levelname)s %(asctime)s - %(message)s"
 logging.basicConfig(
     filename="logfile.log",
@@ -21,6 +26,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger()
 
+MRV_URL = "https://mrv.emsa.europa.eu/#public/emission-report"
+BUCKET = "eu-marv-ship-emissions"
+DOWNLOAD_DIRECTORY = "/tmp"
+# the number of reports uploaded at the same time, the browser downloads all of them at once
+MAX_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 4))
+REPORTS_TABLE_XPATH = '//*[@id="exportablegrid-1137-body"]'
+# the explicit waits give up after these many seconds
+PAGE_TIMEOUT = int(os.environ.get("PAGE_TIMEOUT", 120))
+# a download fails when its file did not grow for this long, however long it has been running
+DOWNLOAD_STALL_TIMEOUT = int(os.environ.get("DOWNLOAD_STALL_TIMEOUT", 60))
+DOWNLOAD_TIMEOUT = int(os.environ.get("DOWNLOAD_TIMEOUT", 1800))
+
 
 def prepare_selenium_params():
     options = webdriver.ChromeOptions()
@@ -34,6 +51,18 @@ def prepare_selenium_params():
     return driver
 
 
+def wait_for_reports_table(driver, timeout=PAGE_TIMEOUT):
+    """Waits until the grid of the reports has rendered its rows
+
+    Returns: the element of the grid
+    """
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.find_element(By.XPATH, REPORTS_TABLE_XPATH).find_elements(By.TAG_NAME, "table")
+    )
+
+    return driver.find_element(By.XPATH, REPORTS_TABLE_XPATH)
+
+
 def extract_table_elements(data):
     # Define regular expressions to extract data
     reporting_period_pattern = re.compile(r"Reporting Period(\d+)")
@@ -91,14 +120,9 @@ def get_reporting_table_content():
     try:
         logger.info("Visiting the Thetis MRV website")
 
-        driver.get("https://mrv.emsa.europa.eu/#public/emission-report")
-        time.sleep(30)
-
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//*[@id="exportablegrid-1137-body"]'))
-        )
+        driver.get(MRV_URL)
 
-        tables = driver.find_element(By.XPATH, '//*[@id="exportablegrid-1137-body"]')
+        tables = wait_for_reports_table(driver)
         elements = tables.find_elements(By.TAG_NAME, "table")
         logger.info(f"All elements: {elements}")
         reports = []
@@ -121,38 +145,261 @@ def get_reporting_table_content():
         driver.quit()
 
 
-def download_new_file(report):
+def create_http_client():
+    """The client of the HTTP backend, None when MRV_API_URL is not set and only Selenium is used"""
+    base_url = os.environ.get("MRV_API_URL")
+    if not base_url:
+        return None
+
+    return MRVHttpClient(base_url=base_url, maxsize=MAX_WORKERS)
+
+
+def get_reporting_table_content_http(client):
     """
-    This function gets called to download the new file from the website
-    It uses Selenium to click on the new link text
+    Same as get_reporting_table_content, with the metadata fetched from the endpoint that fills
+    the table instead of the rendered page
 
+    Returns: a Pandas dataframe with the columns: ['Reporting Period', 'Version', 'Generation Date', 'File']
     """
-    driver = prepare_selenium_params()
+    logger.info("Fetching the reports from the Thetis MRV endpoints")
+    reports = [extract_table_elements(data=record) for record in client.report_records()]
+
+    return pd.DataFrame(reports)
+
+
+def get_reports_metadata():
+    """Gets the metadata of the reports with the HTTP backend when it is configured, falling back
+    to Selenium when it is not or when it fails
+    """
+    client = create_http_client()
+    if client is not None:
+        try:
+            return get_reporting_table_content_http(client)
+        except Exception as e:
+            logger.error(f"The HTTP backend failed, falling back to Selenium: {e}")
+
+    return get_reporting_table_content()
+
+
+def download_new_file(report, driver=None):
+    """
+    This function gets called to download the new file from the website
+    It uses Selenium to click on the new link text. When a driver is given, the link is clicked
+    in its session, which must already show the reports table, and the session is left open so
+    the download can go on while other links are clicked
 
-    driver.get("https://mrv.emsa.europa.eu/#public/emission-report")
-    time.sleep(10)
+    """
+    own_driver = driver is None
+    if own_driver:
+        driver = prepare_selenium_params()
 
     try:
+        if own_driver:
+            driver.get(MRV_URL)
+            wait_for_reports_table(driver)
+
         logger.info(f"Downloading the new report: {report}")
 
-        wait = WebDriverWait(driver, 30)
-        link = wait.until(EC.presence_of_element_located((By.LINK_TEXT, report)))
+        wait = WebDriverWait(driver, PAGE_TIMEOUT)
+        link = wait.until(EC.element_to_be_clickable((By.LINK_TEXT, report)))
         link.click()
-        time.sleep(20)
+        logger.info(f"Started the download of {report}")
 
-        logger.info("File is downloaded")
+        if own_driver and wait_for_download(f"{DOWNLOAD_DIRECTORY}/{report}.xlsx"):
+            logger.info("File is downloaded")
 
     except Exception as e:
         logger.error(f"An error occurred while getting the data: {e}")
         logger.error(traceback.format_exc())
+    finally:
+        if own_driver:
+            driver.quit()
+
+
+def _download_size(filepath):
+    """The size of the download so far, Chrome writes it to a .crdownload file until it ends"""
+    for path in (f"{filepath}.crdownload", filepath):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            continue
+
+    return None
+
+
+def wait_for_download(
+    filepath,
+    stall_timeout=DOWNLOAD_STALL_TIMEOUT,
+    timeout=DOWNLOAD_TIMEOUT,
+    settle_time=1.0,
+    poll_interval=0.25,
+):
+    """
+    Waits until the browser has finished writing the file
+
+    The download is complete when the .crdownload partial file is gone, the file exists and its
+    size did not change for settle_time seconds. The timeout adapts to the speed of the network:
+    the wait goes on for as long as the file keeps growing and only gives up when it stalled for
+    stall_timeout seconds, or when it took longer than timeout overall
+
+    Returns: True if the file is complete, False if the download stalled or timed out
+    """
+    start = time.monotonic()
+    last_size = None
+    last_change = start
+
+    while True:
+        now = time.monotonic()
+        size = _download_size(filepath)
+        if size != last_size:
+            last_size = size
+            last_change = now
+        elif (
+            size is not None
+            and not os.path.exists(f"{filepath}.crdownload")
+            and os.path.exists(filepath)
+            and now - last_change >= settle_time
+        ):
+            logger.info(f"Downloaded {filepath} ({size} bytes) in {now - start:.1f}s")
+            return True
+
+        if now - last_change > stall_timeout or now - start > timeout:
+            logger.error(f"The download of {filepath} stalled at {last_size} bytes")
+            return False
+
+        time.sleep(poll_interval)
+
+
+def ingest_file(row, filepath, s3_client, manifest=None):
+    """
+    Uploads a downloaded report to S3 and records it in the manifest, then deletes the local copy
+
+    A file whose content is already in the manifest is not uploaded again, so the stages that
+    run on new objects of the bucket are not triggered for it either. Its entry gets the version
+    and the generation date of the row, so the next run does not fetch it again.
+
+    Returns: True if the content of the report is in the bucket
+    """
+    filename = os.path.basename(filepath)
+    object_name = f"raw/{row['Reporting Period']}/{filename}"
+    sha256 = file_sha256(filepath)
+    size = os.path.getsize(filepath)
+    known = manifest.find(sha256) if manifest is not None else None
+
+    if known is not None:
+        logger.info(f"{filename} has the same content as {known['object_name']}, skipping it")
+        object_name, etag, uploaded = known["object_name"], known["etag"], True
+    else:
+        stored = upload_file(
+            file_name=filepath, bucket=BUCKET, object_name=object_name, s3_client=s3_client
+        )
+        etag, uploaded = (stored["etag"], True) if stored else (None, False)
+
+    delete_file_from_local_directory(filepath=filepath)
+
+    if uploaded and manifest is not None:
+        manifest.record(
+            sha256,
+            size=size,
+            reporting_period=row["Reporting Period"],
+            version=row["Version_new"],
+            generation_date=row["Generation Date_new"],
+            file=row["File_new"].strip(),
+            object_name=object_name,
+            etag=etag,
+        )
+
+    return uploaded
+
+
+def transfer_report(row, s3_client, manifest=None):
+    """Waits for the download of a report by the browser and ingests it
+
+    Returns: True if the report is in the bucket
+    """
+    filepath = f"{DOWNLOAD_DIRECTORY}/{row['File_new'].strip()}.xlsx"
+
+    if not wait_for_download(filepath):
+        logger.error(f"The download of {filepath} did not finish in time")
+        return False
+
+    return ingest_file(row, filepath, s3_client, manifest)
+
+
+def download_and_upload_reports(rows, max_workers=MAX_WORKERS, s3_client=None, manifest=None):
+    """
+    Downloads the reports of all the new versions and uploads them to S3
+
+    One browser session clicks every link, so the browser downloads the files concurrently,
+    and a pool of threads uploads each file as soon as its download is complete, sharing one
+    S3 client. The whole refresh takes about as long as the slowest file.
+
+    Returns: the list of rows whose report was uploaded
+    """
+    s3_client = s3_client or create_s3_client(max_workers)
+    driver = prepare_selenium_params()
+
+    try:
+        driver.get(MRV_URL)
+        wait_for_reports_table(driver)
+
+        for row in rows:
+            download_new_file(report=row["File_new"].strip(), driver=driver)
+
+        # the session stays open until the uploads are done, closing it cancels the downloads
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            uploaded = list(pool.map(lambda row: transfer_report(row, s3_client, manifest), rows))
     finally:
         driver.quit()
 
+    return [row for row, done in zip(rows, uploaded) if done]
+
+
+def fetch_report_http(row, client, s3_client, manifest=None):
+    """Streams a report from the HTTP backend to disk, where it is hashed, and ingests it
+
+    Returns: True if the report is in the bucket
+    """
+    report = row["File_new"].strip()
+    try:
+        filepath = client.download(report, DOWNLOAD_DIRECTORY)
+    except Exception as e:
+        logger.error(f"An error occurred while downloading {report}: {e}")
+        return False
+
+    return ingest_file(row, filepath, s3_client, manifest)
+
 
-def compare_versions_and_download_file(current_df, new_df):
+def fetch_reports(rows, manifest=None, max_workers=MAX_WORKERS):
+    """
+    Gets the reports of the new versions into S3 with the HTTP backend, when it is configured,
+    and with the browser for the reports it could not fetch
+
+    Returns: the list of rows whose report is in the bucket
+    """
+    s3_client = create_s3_client(max_workers)
+    client = create_http_client()
+    uploaded = []
+
+    if client is not None:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            done = list(
+                pool.map(lambda row: fetch_report_http(row, client, s3_client, manifest), rows)
+            )
+        uploaded = [row for row, ok in zip(rows, done) if ok]
+        rows = [row for row, ok in zip(rows, done) if not ok]
+
+    if rows:
+        uploaded += download_and_upload_reports(rows, max_workers, s3_client, manifest)
+
+    return uploaded
+
+
+def compare_versions_and_download_file(current_df, new_df, manifest=None):
     """
     This function compares the version of the file from the new time we pull the data
-    and it compares the new version with the old version that is on disk
+    and it compares the new version with the old version that is on disk. The files that are
+    downloaded are recorded in the manifest, when one is given
     """
     logger.info("Comparing the versions in the current and new dataframes")
 
@@ -164,42 +411,24 @@ def compare_versions_and_download_file(current_df, new_df):
     logger.info("New versions")
     logger.info(new_versions.head())
 
-    if not new_versions.empty:
-        logger.info(
-            f"New version: {new_versions['Version_new']} was found for file: {new_versions['File_new']}"
-        )
+    if new_versions.empty:
+        logger.info("There are no new versions of the data in the website")
+        return current_df
 
-        download_directory = "/tmp"
-        for index, row in new_versions.iterrows():
-            logger.info("Updating the current dataframe with the new versions")
-
-            current_df.loc[
-                current_df["Reporting Period"] == row["Reporting Period"], "Version"
-            ] = row["Version_new"]
-            current_df.loc[
-                current_df["Reporting Period"] == row["Reporting Period"], "Generation Date"
-            ] = row["Generation Date_new"]
-            current_df.loc[current_df["Reporting Period"] == row["Reporting Period"], "File"] = row[
-                "File_new"
-            ]
-
-            download_new_file(report=row["File_new"].strip())
-
-            filepath = f"{download_directory}/{row['File_new'].strip()}.xlsx"
-            year = row["Reporting Period"]
-            filename = f"{row['File_new'].strip()}.xlsx"
-
-            upload_file(
-                file_name=filepath,
-                bucket="eu-marv-ship-emissions",
-                object_name=f"raw/{year}/{filename}",
-            )
+    logger.info(
+        f"New version: {new_versions['Version_new']} was found for file: {new_versions['File_new']}"
+    )
 
-            delete_file_from_local_directory(filepath=filepath)
+    rows = [row for _, row in new_versions.iterrows()]
+    for row in fetch_reports(rows, manifest):
+        logger.info("Updating the current dataframe with the new versions")
 
-            return current_df
-    else:
-        logger.info("There are no new versions of the data in the website")
+        period = current_df["Reporting Period"] == row["Reporting Period"]
+        current_df.loc[period, "Version"] = row["Version_new"]
+        current_df.loc[period, "Generation Date"] = row["Generation Date_new"]
+        current_df.loc[period, "File"] = row["File_new"]
+
+    return current_df
 
 
 def delete_file_from_local_directory(filepath):
@@ -220,14 +449,15 @@ def fix_column_types(df):
     return df
 
 
-def upload_file(file_name, bucket, object_name=None):
+def upload_file(file_name, bucket, object_name=None, s3_client=None):
     """
     Upload a file to an S3 bucket
 
     :param file_name: File to upload
     :param bucket: Bucket to upload to
     :param object_name: S3 object name. If not specified then file_name is used
-    :return: True if file was uploaded, else False
+    :param s3_client: the shared client, a new one is created if not specified
+    :return: the size, sha256 and etag of the verified object if it was uploaded, else None
     """
 
     logger.info("Starting the upload to S3")
@@ -236,40 +466,58 @@ def upload_file(file_name, bucket, object_name=None):
     if object_name is None:
         object_name = os.path.basename(file_name)
 
-    s3_client = boto3.client("s3", region_name="us-east-1")
-
     try:
         logger.info(
             f"Uploading the file: {file_name} to the bucket: {bucket} with object name: {object_name}"
         )
 
-        s3_client.upload_file(file_name, bucket, object_name)
-    except ClientError as e:
+        return s3_transfer.upload_file(file_name, bucket, object_name, s3_client=s3_client)
+    except s3_transfer.UPLOAD_ERRORS as e:
         logging.error(e)
-        return False
-    return True
+        return None
+
+
+def current_versions(manifest, metadata_path="reports_metadata.csv"):
+    """The current version of every reporting period
+
+    The manifest only holds the periods that were fetched since it was created, so its versions
+    are merged over the ones of the csv, keeping the highest version of each period.
+    """
+    frames = [manifest.latest_versions()]
+    if os.path.exists(metadata_path):
+        frames.append(pd.read_csv(metadata_path))
+
+    frames = [fix_column_types(frame) for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["Reporting Period", "Version", "Generation Date", "File"])
+
+    versions = pd.concat(frames, ignore_index=True).sort_values("Version", kind="stable")
+    latest = versions.groupby("Reporting Period").tail(1)
+    return latest.sort_values("Reporting Period").reset_index(drop=True)
 
 
 def main():
     logger.info("Getting the new metadata from the reports table")
-    reports_df_new = get_reporting_table_content()
+    reports_df_new = get_reports_metadata()
     reports_df_new = fix_column_types(reports_df_new)
 
     logger.info("New metadata from the website")
     logger.info(reports_df_new.head())
 
-    reports_df_old = pd.read_csv("reports_metadata.csv")
-    reports_df_old = fix_column_types(reports_df_old)
+    # the manifest outlives the container, the csv of the image has the periods it does not hold
+    manifest = IngestionManifest(s3_client=create_s3_client()).load()
+    reports_df_old = current_versions(manifest)
 
-    logger.info("Current metadata from local master file")
+    logger.info("Current metadata from the ingestion manifest and the csv")
     logger.info(reports_df_old.head())
 
     reports_df_updated = compare_versions_and_download_file(
-        current_df=reports_df_old, new_df=reports_df_new
+        current_df=reports_df_old, new_df=reports_df_new, manifest=manifest
     )
 
     logger.info("Got new files and added them to the S3 bucket")
 
+    manifest.save()
     reports_df_updated.to_csv("reports_metadata.csv", index=False)
 
 
@@ -0,0 +1,190 @@
+import base64
+import binascii
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+SUMMARY_COLUMNS = {
+    "emissions": "Total CO₂ emissions [m tonnes]",
+    "fuel_consumption": "Total fuel consumption [m tonnes]",
+}
+SUMMARY_QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+class StaleCursorError(Exception):
+    """The cursor was given with a page of another version of the dataset"""
+
+
+def encode_cursor(offset: int, version: Optional[str] = None) -> str:
+    """Turns a position in one of the indexes into the opaque cursor given to the clients, with the
+    version of the dataset the position belongs to
+    """
+    return base64.urlsafe_b64encode(f"{version or ''}:{offset}".encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str], version: Optional[str] = None) -> int:
+    """Turns a cursor back into a position, a missing cursor points to the first row
+
+    Raises:
+        ValueError: if the cursor was not produced by encode_cursor
+        StaleCursorError: if the cursor was produced for another version of the dataset, the same
+            position would point to other rows after a reload
+    """
+    if cursor is None:
+        return 0
+
+    try:
+        cursor_version, separator, offset = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().rpartition(":")
+        )
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+    if not separator or offset < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+    if cursor_version != (version or ""):
+        raise StaleCursorError(f"The cursor {cursor} belongs to another version of the dataset")
+
+    return offset
+
+
+def to_split_dict(frame: pd.DataFrame) -> Dict:
+    """Converts rows to the {‘index’ -> [index], ‘columns’ -> [columns], ‘data’ -> [values]} form
+
+    The values of the float32 columns are left as numpy scalars, which orjson renders with their
+    shortest float32 representation, so 15.97 is sent as 15.97 instead of 15.970000267028809
+    without widening the columns.
+    """
+    # Series.tolist boxes the values like to_dict, the float32 values stay numpy scalars
+    values = [
+        list(frame.iloc[:, i].to_numpy()) if dtype == np.float32 else frame.iloc[:, i].tolist()
+        for i, dtype in enumerate(frame.dtypes)
+    ]
+    return {
+        "index": frame.index.tolist(),
+        "columns": list(frame.columns),
+        "data": [list(row) for row in zip(*values)],
+    }
+
+
+class EmissionsStore:
+    """In-memory view of the emissions dataset used by the API.
+
+    The frame is indexed once when the store is built: every IMO Number and every ship type
+    is mapped to the row positions it owns, so the request handlers can check membership and
+    slice the rows they need without scanning the whole frame. The summaries of the emissions
+    and the fuel consumption per ship type and reporting period are computed at the same time.
+    """
+
+    def __init__(self, df: pd.DataFrame, version: Optional[str] = None):
+        # reset_index copies every column, the frame of a memory-mapped snapshot already has a
+        # RangeIndex and keeps its columns as views on the mapped pages
+        self.df = df if df.index.equals(pd.RangeIndex(len(df))) else df.reset_index(drop=True)
+        self.version = version
+        self._by_imo = self._build_index("IMO Number")
+        self._by_ship_type = self._build_index("Ship type")
+        self.ship_types = list(self.df["Ship type"].unique())
+        self.all_positions = np.arange(len(self.df), dtype=np.int64)
+        self._arrow_schema = None
+        self._summaries = {
+            name: self._build_summary(column) for name, column in SUMMARY_COLUMNS.items()
+        }
+
+    def _build_index(self, column: str) -> Dict:
+        """Maps every value of the column to the sorted positions of the rows holding it"""
+        return {
+            key: np.asarray(positions, dtype=np.int64)
+            for key, positions in self.df.groupby(column, sort=False, observed=True).indices.items()
+        }
+
+    def _build_summary(self, column: str) -> Dict:
+        """Aggregates a column by ship type and reporting period
+
+        Args:
+            column (str): the numeric column to aggregate
+
+        Returns:
+            Dict: maps every ship type to a list with one record per reporting period holding the
+            count, sum, mean and quantiles of the column
+        """
+        values = pd.to_numeric(self.df[column], errors="coerce").astype(np.float64)
+        grouped = values.groupby(
+            [self.df["Ship type"], self.df["Reporting Period"]], observed=True, sort=True
+        )
+
+        stats = grouped.agg(["count", "sum", "mean"])
+        quantiles = grouped.quantile(list(SUMMARY_QUANTILES)).unstack()
+        quantiles.columns = [f"p{round(q * 100)}" for q in SUMMARY_QUANTILES]
+        stats = stats.join(quantiles).round(2).reset_index(level="Reporting Period")
+
+        return {
+            ship_type: frame.to_dict(orient="records")
+            for ship_type, frame in stats.groupby(level="Ship type", observed=True)
+        }
+
+    def summary(self, name: str, ship_type: str) -> List[Dict]:
+        """Returns the precomputed summary of a ship type, see SUMMARY_COLUMNS for the names"""
+        return self._summaries[name][ship_type]
+
+    def has_ship(self, ship_id: int) -> bool:
+        return ship_id in self._by_imo
+
+    def has_ship_type(self, ship_type: str) -> bool:
+        return ship_type in self._by_ship_type
+
+    def ship_positions(self, ship_id: int) -> np.ndarray:
+        return self._by_imo[ship_id]
+
+    def ship_type_positions(self, ship_type: str) -> np.ndarray:
+        return self._by_ship_type[ship_type]
+
+    def rows(self, positions: np.ndarray, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Returns the rows at the given positions, optionally restricted to some columns
+
+        Args:
+            positions (np.ndarray): row positions taken from one of the indexes
+            columns (Optional[List[str]]): the columns to keep, all of them if None
+
+        Returns:
+            pd.DataFrame: the selected rows with the original index of the dataset
+        """
+        if columns is None:
+            return self.df.iloc[positions]
+
+        return self.df.iloc[positions, self.df.columns.get_indexer(columns)]
+
+    def page_positions(
+        self, positions: np.ndarray, limit: Optional[int] = None, cursor: Optional[str] = None
+    ) -> Tuple[np.ndarray, Optional[str]]:
+        """Returns the positions of the rows of one page
+
+        The cursor is an offset in the positions array, so every page is a slice of the index and
+        costs the same no matter how deep in the results it is. It carries the version of the
+        store, a cursor of another version is refused instead of skipping or repeating rows.
+
+        Args:
+            positions (np.ndarray): row positions taken from one of the indexes
+            limit (Optional[int]): the size of the page, everything after the cursor if None
+            cursor (Optional[str]): the cursor returned with the previous page
+
+        Returns:
+            Tuple[np.ndarray, Optional[str]]: the positions of the page and the cursor of the next
+            page, which is None when this is the last one
+        """
+        start = decode_cursor(cursor, self.version)
+        end = len(positions) if limit is None else min(start + limit, len(positions))
+        next_cursor = encode_cursor(end, self.version) if end < len(positions) else None
+
+        return positions[start:end], next_cursor
+
+    @property
+    def arrow_schema(self) -> pa.Schema:
+        """The Arrow schema of the whole dataset, inferred once so every streamed batch shares it"""
+        if self._arrow_schema is None:
+            self._arrow_schema = pa.Schema.from_pandas(self.df, preserve_index=False)
+
+        return self._arrow_schema
@@ -0,0 +1,214 @@
+"""Canonical column types of the emissions dataset
+
+Every loader (the API, the snapshot builder, the preprocessor, the converter and the dashboard)
+applies these types, so the low cardinality text columns are categoricals, the emission and fuel
+columns are float32, the ids and periods are small ints and the DoC dates are datetimes. The
+columns can be named like in the EU-MRV workbooks or in snake case like in the Athena tables.
+"""
+import argparse
+import re
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+CATEGORICAL_COLUMNS = [
+    "Ship type",
+    "Port of Registry",
+    "Home Port",
+    "Ice Class",
+    "Verifier Name",
+    "Verifier NAB",
+    "Verifier Address",
+    "Verifier City",
+    "Verifier Accreditation number",
+    "Verifier Country",
+    "Technical efficiency",
+    "technical_efficiency_type",
+]
+INT32_COLUMNS = ["IMO Number", "Verifier Number"]
+INT16_COLUMNS = ["Reporting Period"]
+FLOAT32_COLUMNS = ["technical_efficiency_value"]
+DATE_COLUMNS = ["DoC issue date", "DoC expiry date"]
+# a ship has one row per reporting period
+REPORT_KEY = ["IMO Number", "Reporting Period"]
+
+# The type has to come before the first number, the value is the first number of the string
+TECHNICAL_EFFICIENCY_PATTERN = r"^(?:\D*?(?P<type>EEDI|EIV))?\D*(?P<value>\d+(?:\.\d+)?)?"
+
+
+def snake_case(column: str) -> str:
+    """Names a workbook column like awswrangler and the Glue catalog do,
+    e.g. "Total CO₂ emissions [m tonnes]" becomes "total_co_emissions_m_tonnes_"
+    """
+    return re.sub(r"[^a-z0-9]+", "_", column.lower())
+
+
+def _by_both_names(columns):
+    return set(columns) | {snake_case(column) for column in columns}
+
+
+_KINDS = {
+    "category": _by_both_names(CATEGORICAL_COLUMNS),
+    "int32": _by_both_names(INT32_COLUMNS),
+    "int16": _by_both_names(INT16_COLUMNS),
+    "float32": _by_both_names(FLOAT32_COLUMNS),
+    "datetime": _by_both_names(DATE_COLUMNS),
+}
+
+
+def column_kind(column: str) -> Optional[str]:
+    """Returns the canonical kind of a column, None for the columns left as they are
+
+    Besides the listed columns, every measurement column, which has its unit in brackets like
+    "[m tonnes]" or "[kg / n mile]", is a float32.
+    """
+    for kind, columns in _KINDS.items():
+        if column in columns:
+            return kind
+
+    if re.search(r"\[.+\]", column) or column.endswith("_m_tonnes_"):
+        return "float32"
+
+    return None
+
+
+def arrow_type(column: str) -> Optional[pa.DataType]:
+    """The Arrow type of a column when it is written to Parquet, Feather or an Arrow snapshot"""
+    return {
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "int32": pa.int32(),
+        "int16": pa.int16(),
+        "float32": pa.float32(),
+        "datetime": pa.timestamp("ms"),
+    }.get(column_kind(column))
+
+
+def _to_int(values: pd.Series, dtype: str) -> pd.Series:
+    numbers = pd.to_numeric(values, errors="coerce")
+    # the nullable Int types are only used when there is something missing
+    return numbers.astype(dtype.capitalize() if numbers.isna().any() else dtype)
+
+
+def _to_datetime(values: pd.Series) -> pd.Series:
+    """Parses the ISO dates, like the ones of the interim csv, then the day first dates of the
+    workbooks like "31/05/2019". Letting pandas guess the format from the first value would read
+    2019-05-12 as the 5th of December and every other date of the column the same way
+    """
+    dates = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    day_first = dates.isna() & values.notna()
+    if day_first.any():
+        dates[day_first] = pd.to_datetime(values[day_first], errors="coerce", format="%d/%m/%Y")
+
+    return dates
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts the columns of the dataset to their canonical types
+
+    Values that do not fit a numeric or a date column, like "Division by zero!" or
+    "DoC not issued", become missing.
+
+    Args:
+        df (pd.DataFrame): the dataset with the workbook or the snake case column names
+
+    Returns:
+        pd.DataFrame: a new frame with the compact types
+    """
+    converted = {}
+    for column in df.columns:
+        kind = column_kind(column)
+        values = df[column]
+        if kind is None:
+            continue
+
+        if kind == "category":
+            converted[column] = values.astype("category")
+        elif kind in ("int32", "int16"):
+            converted[column] = _to_int(values, kind)
+        elif kind == "float32":
+            converted[column] = pd.to_numeric(values, errors="coerce").astype("float32")
+        elif kind == "datetime":
+            converted[column] = _to_datetime(values)
+
+    return df.assign(**converted)
+
+
+def prepare_report(df: pd.DataFrame) -> pd.DataFrame:
+    """Keeps the last row of every ship and period and converts the columns to compact types"""
+    df = df.drop_duplicates(subset=REPORT_KEY, keep="last")
+    return apply_schema(df).reset_index(drop=True)
+
+
+def parse_technical_efficiency(values: pd.Series) -> pd.DataFrame:
+    """Parses the technical efficiency strings like "EIV (15.97 gCO₂/t·nm)" with one regex
+    It follows the Glue job: the type is EIV or EEDI, the value is the first number and both are
+    missing for "Not Applicable" and for nulls
+
+    Args:
+        values (pd.Series): the technical efficiency column
+
+    Returns:
+        pd.DataFrame: the columns technical_efficiency_type (str) and technical_efficiency_value
+        (float) with the index of the input
+    """
+    applicable = values.where(values != "Not Applicable").astype("string")
+    parsed = applicable.str.extract(TECHNICAL_EFFICIENCY_PATTERN)
+
+    return pd.DataFrame(
+        {
+            "technical_efficiency_type": parsed["type"]
+            .astype(object)
+            .where(parsed["type"].notna()),
+            "technical_efficiency_value": parsed["value"].astype(float),
+        },
+        index=values.index,
+    )
+
+
+def process_technical_efficiency_values(
+    df: pd.DataFrame, column: str = "Technical efficiency"
+) -> pd.DataFrame:
+    """Gets the datasets, processes the technical efficiency column and splits it into two columns
+    one column for the type and one column for the value
+
+    Args:
+        df (pd.DataFrame): the dataset with the technical efficiency column
+        column (str): the name of the technical efficiency column
+
+    Returns:
+        pd.DataFrame: the dataset with the technical_efficiency_type and technical_efficiency_value columns
+    """
+    parsed = parse_technical_efficiency(df[column])
+    df = df.assign(**{name: parsed[name] for name in parsed.columns})
+
+    return df
+
+
+def memory_footprint(df: pd.DataFrame) -> int:
+    """The bytes used by the frame, counting the content of the python strings"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def footprint_report(before: pd.DataFrame, after: pd.DataFrame) -> str:
+    """Describes how much memory the canonical types saved"""
+    before_bytes = memory_footprint(before)
+    after_bytes = memory_footprint(after)
+    return (
+        f"{len(before)} rows: {before_bytes / 1e6:.1f} MB with the default types, "
+        f"{after_bytes / 1e6:.1f} MB with the canonical schema "
+        f"({before_bytes / max(after_bytes, 1):.1f}x smaller)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory used by a csv of the dataset")
+    parser.add_argument("csv", help="a csv of the dataset, like the interim one")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    print(footprint_report(df, apply_schema(df)))
+
+
+if __name__ == "__main__":
+    main()
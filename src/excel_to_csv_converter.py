@@ -1,11 +1,195 @@
+import argparse
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from typing import Dict, List, Optional
 
-import pandas as pd
+from emissions_schema import arrow_type
+from projection_plan import load_plan
+from xlsx_stream import (
+    iter_xlsx_batches,
+    write_csv,
+    write_feather,
+    write_partitioned_parquet,
+)
 
+OUTPUT_FORMATS = ("parquet", "feather", "csv")
+PARTITION_COLUMN = "Reporting Period"
 
-def excel_to_csv_converter(filename):
-    df = pd.read_excel(filename, header=2)
 
+def excel_to_csv_converter(filename, batch_size=10000):
+    """Converts a workbook to csv, streaming it in batches of rows so memory stays constant"""
     new_extension = os.path.splitext(filename)[0] + ".csv"
     print(new_extension)
-    df.to_csv(new_extension, index=False)
+    write_csv(iter_xlsx_batches(filename, header=2, batch_size=batch_size), new_extension)
+
+
+def output_paths(filename: str, output_dir: str, output_format: str) -> List[str]:
+    """Finds the files a previous conversion of the workbook wrote"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if output_format == "parquet":
+        return glob(os.path.join(output_dir, "*=*", f"{stem}.parquet"))
+
+    path = os.path.join(output_dir, f"{stem}.{output_format}")
+    return [path] if os.path.exists(path) else []
+
+
+def is_up_to_date(filename: str, outputs: List[str]) -> bool:
+    """A workbook is skipped when all the files converted from it are newer than it"""
+    if not outputs:
+        return False
+
+    return min(os.path.getmtime(output) for output in outputs) >= os.path.getmtime(filename)
+
+
+def convert_file(
+    filename: str,
+    output_dir: str,
+    output_format: str = "parquet",
+    compression: Optional[str] = "snappy",
+    batch_size: int = 10000,
+    force: bool = False,
+    columns: Optional[List[str]] = None,
+) -> Dict:
+    """Converts one workbook, unless it was already converted after its last change
+
+    Args:
+        filename (str): the xlsx file
+        output_dir (str): where the converted files are written
+        output_format (str): parquet (partitioned by Reporting Period), feather or csv
+        compression (Optional[str]): the codec of the Parquet or Feather files
+        batch_size (int): the number of rows read and written at a time
+        force (bool): convert the workbook even if it is up to date
+        columns (Optional[List[str]]): the columns to convert, like the ones of a projection plan,
+            all of them if None
+
+    Returns:
+        Dict: the file, the rows written, the size of the workbook, the seconds it took and
+        whether it was skipped
+    """
+    start = time.perf_counter()
+    stats = {"file": filename, "bytes": os.path.getsize(filename), "rows": 0, "skipped": False}
+
+    outputs = output_paths(filename, output_dir, output_format)
+    if not force and is_up_to_date(filename, outputs):
+        stats.update(skipped=True, seconds=time.perf_counter() - start)
+        return stats
+
+    # a period can disappear from a new version of the workbook, drop what the last run wrote
+    for output in outputs:
+        os.remove(output)
+
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if columns is not None and output_format == "parquet" and PARTITION_COLUMN not in columns:
+        columns = [*columns, PARTITION_COLUMN]
+    batches = iter_xlsx_batches(filename, header=2, batch_size=batch_size, columns=columns)
+
+    if output_format == "parquet":
+        written = write_partitioned_parquet(
+            batches,
+            output_dir,
+            PARTITION_COLUMN,
+            f"{stem}.parquet",
+            compression=compression,
+            types=arrow_type,
+        )
+        stats["rows"] = sum(written.values())
+    elif output_format == "feather":
+        path = os.path.join(output_dir, f"{stem}.feather")
+        stats["rows"] = write_feather(batches, path, compression=compression, types=arrow_type)
+    else:
+        stats["rows"] = write_csv(batches, os.path.join(output_dir, f"{stem}.csv"))
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def convert_directory(
+    raw_dir: str,
+    output_dir: str,
+    output_format: str = "parquet",
+    compression: Optional[str] = "snappy",
+    batch_size: int = 10000,
+    max_workers: Optional[int] = None,
+    force: bool = False,
+    columns: Optional[List[str]] = None,
+) -> List[Dict]:
+    """Converts all the workbooks of a directory in parallel, one process per workbook
+
+    Returns:
+        List[Dict]: the stats of every workbook, see convert_file
+    """
+    files = sorted(glob(os.path.join(raw_dir, "*.xlsx")))
+    arguments = [output_dir, output_format, compression, batch_size, force, columns]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(convert_file, files, *[[arg] * len(files) for arg in arguments]))
+
+
+def print_summary(stats: List[Dict], seconds: float):
+    """Prints what was converted and the overall throughput"""
+    for file_stats in stats:
+        if file_stats["skipped"]:
+            print(f"{file_stats['file']}: up to date, skipped")
+        else:
+            print(
+                f"{file_stats['file']}: {file_stats['rows']} rows in {file_stats['seconds']:.1f}s"
+            )
+
+    converted = [file_stats for file_stats in stats if not file_stats["skipped"]]
+    rows = sum(file_stats["rows"] for file_stats in converted)
+    megabytes = sum(file_stats["bytes"] for file_stats in converted) / 1e6
+    seconds = max(seconds, 1e-9)
+    print(
+        f"Converted {len(converted)} of {len(stats)} files: {rows} rows, {megabytes:.1f} MB in "
+        f"{seconds:.1f}s ({rows / seconds:.0f} rows/s, {megabytes / seconds:.2f} MB/s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the EU-MRV workbooks of a directory")
+    parser.add_argument("raw_dir", help="the directory with the xlsx files")
+    parser.add_argument("output_dir", help="where the converted files are written")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="parquet")
+    parser.add_argument(
+        "--compression",
+        default="snappy",
+        help="snappy, gzip, zstd or none for parquet, lz4, zstd or none for feather",
+    )
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=None, help="one per core by default")
+    parser.add_argument("--force", action="store_true", help="convert the up to date files too")
+    parser.add_argument(
+        "--plan", default=None, help="a projection plan, only the columns it keeps are converted"
+    )
+    args = parser.parse_args()
+
+    columns = None
+    if args.plan:
+        plan = load_plan(args.plan)
+        if plan is None:
+            parser.error(f"No projection plan at {args.plan}")
+        columns = plan["columns"]
+
+    compression = None if args.compression == "none" else args.compression
+    if args.format == "feather" and compression == "snappy":
+        compression = "lz4"
+
+    start = time.perf_counter()
+    stats = convert_directory(
+        args.raw_dir,
+        args.output_dir,
+        output_format=args.format,
+        compression=compression,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        force=args.force,
+        columns=columns,
+    )
+    print_summary(stats, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
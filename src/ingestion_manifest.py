@@ -0,0 +1,148 @@
+"""Manifest of the ingested EU-MRV reports
+
+The manifest is a JSON document, stored on disk or in S3, that records every report file that was
+ingested by the SHA-256 of its content, with its size, the ETag of its S3 object, the reporting
+period, the version and the generation date. It is the state of the pipeline that survives a
+redeploy of the scraper:
+
+- data_acquisition takes the current versions from it and does not upload a file whose content
+  was already ingested, so nothing downstream of the bucket runs again for it
+- the preprocessor records which files it already turned into period outputs, so only the
+  periods of new or changed files are recomputed
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import boto3
+import pandas as pd
+
+MANIFEST_LOCATION = os.environ.get(
+    "INGESTION_MANIFEST", "s3://eu-marv-ship-emissions/manifests/ingestion_manifest.json"
+)
+
+
+class IngestionManifest:
+    """The files ingested by hash and the files processed by the preprocessor
+
+    Args:
+        location (str): a local path or an s3://bucket/key url
+        s3_client: the client used when the manifest is in S3
+    """
+
+    def __init__(self, location: str = MANIFEST_LOCATION, s3_client=None):
+        self.location = location
+        self.s3_client = s3_client
+        self.files = {}
+        self.processed = {}
+
+    @property
+    def in_s3(self) -> bool:
+        return self.location.startswith("s3://")
+
+    def _s3(self):
+        if self.s3_client is None:
+            self.s3_client = boto3.client("s3")
+
+        url = urlparse(self.location)
+        return self.s3_client, url.netloc, url.path.lstrip("/")
+
+    def load(self) -> "IngestionManifest":
+        """Reads the manifest, a manifest that does not exist yet is empty"""
+        if self.in_s3:
+            s3_client, bucket, key = self._s3()
+            try:
+                body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+            except s3_client.exceptions.NoSuchKey:
+                return self
+        elif os.path.exists(self.location):
+            with open(self.location, "rb") as file:
+                body = file.read()
+        else:
+            return self
+
+        content = json.loads(body)
+        self.files = content.get("files", {})
+        self.processed = content.get("processed", {})
+        return self
+
+    def save(self):
+        body = json.dumps({"files": self.files, "processed": self.processed}, indent=2).encode()
+        if self.in_s3:
+            s3_client, bucket, key = self._s3()
+            s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+            return
+
+        os.makedirs(os.path.dirname(self.location) or ".", exist_ok=True)
+        # a crash while writing must not leave a truncated manifest behind
+        partial = f"{self.location}.partial"
+        with open(partial, "wb") as file:
+            file.write(body)
+        os.replace(partial, self.location)
+
+    def find(self, sha256: str) -> Optional[Dict]:
+        """The entry of a file with this content, None if it was never ingested"""
+        return self.files.get(sha256)
+
+    def record(
+        self,
+        sha256: str,
+        size: int,
+        reporting_period: int,
+        version: int,
+        generation_date: str,
+        file: str,
+        object_name: Optional[str] = None,
+        etag: Optional[str] = None,
+    ) -> Dict:
+        """Adds an ingested file to the manifest"""
+        self.files[sha256] = {
+            "sha256": sha256,
+            "size": size,
+            "etag": etag,
+            "reporting_period": int(reporting_period),
+            "version": int(version),
+            "generation_date": str(generation_date),
+            "file": file,
+            "object_name": object_name,
+            "ingested_at": datetime.now(timezone.utc).isoformat(),
+        }
+        return self.files[sha256]
+
+    def latest_versions(self) -> pd.DataFrame:
+        """The latest version of every reporting period, with the columns of reports_metadata.csv
+
+        Returns:
+            pd.DataFrame: the columns Reporting Period, Version, Generation Date and File
+        """
+        columns = ["Reporting Period", "Version", "Generation Date", "File"]
+        if not self.files:
+            return pd.DataFrame(columns=columns)
+
+        entries = pd.DataFrame(self.files.values())
+        latest = entries.sort_values("version").groupby("reporting_period").tail(1)
+        latest = latest.rename(
+            columns={
+                "reporting_period": "Reporting Period",
+                "version": "Version",
+                "generation_date": "Generation Date",
+                "file": "File",
+            }
+        )
+        return latest[columns].sort_values("Reporting Period").reset_index(drop=True)
+
+    def is_processed(self, sha256: str, columns: Optional[List[str]] = None) -> bool:
+        """Whether the preprocessor already wrote the rows of the file, with the same columns"""
+        entry = self.processed.get(sha256)
+        return entry is not None and (columns is None or entry["columns"] == list(columns))
+
+    def mark_processed(
+        self, sha256: str, reporting_periods: Iterable[int], columns: Optional[List[str]] = None
+    ):
+        """Records that the rows of a file were written to the outputs of its periods"""
+        self.processed[sha256] = {
+            "reporting_periods": sorted(int(period) for period in reporting_periods),
+            "columns": list(columns) if columns is not None else None,
+        }
@@ -3,10 +3,39 @@ import urllib.parse
 
 import awswrangler as wr
 
-os_input_s3_cleansed_layer = os.environ["s3_cleansed_layer"]
-os_input_glue_catalog_db_name = os.environ["glue_catalog_db_name"]
-os_input_glue_catalog_table_name = os.environ["glue_catalog_table_name"]
-os_input_write_data_operation = os.environ["write_data_operation"]
+from emissions_schema import prepare_report
+
+# a workbook holds one reporting period, so each upload of a new version of the report replaces
+# the partition of that period and leaves the other years as they are
+WRITE_MODE = "overwrite_partitions"
+PARTITION_COLUMNS = ["Reporting Period"]
+# a year is about 12k rows, so a period is written as one file with one row group, which Athena
+# reads with a single request per column. Larger periods are split in files of this many rows
+ROWS_PER_FILE = int(os.environ.get("rows_per_file", 500_000))
+
+# The required columns, all of them are filled in every workbook, see projection_plan
+COLUMNS = [
+    "IMO Number",
+    "CO₂ emissions from all voyages which departed from ports under a MS jurisdiction [m tonnes]",
+    "Total fuel consumption [m tonnes]",
+    "CO₂ emissions from all voyages to ports under a MS jurisdiction [m tonnes]",
+    "CO₂ emissions which occurred within ports under a MS jurisdiction at berth [m tonnes]",
+    "Verifier Country",
+    "Verifier Accreditation number",
+    "Verifier City",
+    "Verifier Address",
+    "Total CO₂ emissions [m tonnes]",
+    "Verifier NAB",
+    "DoC expiry date",
+    "DoC issue date",
+    "Reporting Period",
+    "Ship type",
+    "Name",
+    "Verifier Name",
+    "CO₂ emissions from all voyages between ports under a MS jurisdiction [m tonnes]",
+    "Technical efficiency",
+    "Port of Registry",
+]
 
 
 def lambda_handler(event, context):
@@ -17,45 +46,26 @@ def lambda_handler(event, context):
 
     try:
 
-        # Creating DF from content
-        df_raw = wr.s3.read_excel("s3://{}/{}".format(bucket, key), engine="openpyxl", header=2)
+        # Creating DF from content, parsing only the required columns
+        df_raw = wr.s3.read_excel(
+            "s3://{}/{}".format(bucket, key), engine="openpyxl", header=2, usecols=COLUMNS
+        )
         print(df_raw.head())
         print(df_raw.shape)
 
-        # Extract required columns:
-        df_small = df_raw[
-            [
-                "IMO Number",
-                "CO₂ emissions from all voyages which departed from ports under a MS jurisdiction [m tonnes]",
-                "Total fuel consumption [m tonnes]",
-                "CO₂ emissions from all voyages to ports under a MS jurisdiction [m tonnes]",
-                "CO₂ emissions which occurred within ports under a MS jurisdiction at berth [m tonnes]",
-                "Verifier Country",
-                "Verifier Accreditation number",
-                "Verifier City",
-                "Verifier Address",
-                "Total CO₂ emissions [m tonnes]",
-                "Verifier NAB",
-                "DoC expiry date",
-                "DoC issue date",
-                "Reporting Period",
-                "Ship type",
-                "Name",
-                "Verifier Name",
-                "CO₂ emissions from all voyages between ports under a MS jurisdiction [m tonnes]",
-                "Technical efficiency",
-                "Port of Registry",
-            ]
-        ]
+        df_small = prepare_report(df_raw[COLUMNS])
+        print(f"{len(df_raw) - len(df_small)} duplicated rows dropped")
 
-        # # Write to S3
+        # Write to S3, partitioned by reporting period (reporting_period=<year>/)
         wr_response = wr.s3.to_parquet(
             df=df_small,
-            path=os_input_s3_cleansed_layer,
+            path=os.environ["s3_cleansed_layer"],
             dataset=True,
-            database=os_input_glue_catalog_db_name,
-            table=os_input_glue_catalog_table_name,
-            mode=os_input_write_data_operation,
+            partition_cols=PARTITION_COLUMNS,
+            max_rows_by_file=ROWS_PER_FILE,
+            database=os.environ["glue_catalog_db_name"],
+            table=os.environ["glue_catalog_table_name"],
+            mode=WRITE_MODE,
         )
 
         return wr_response
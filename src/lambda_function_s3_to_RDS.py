@@ -1,35 +1,50 @@
+import functools
 import json
 import logging
-import sys
+import os
 import urllib.parse
 
 import boto3
-import pandas as pd
-import pymysql
 
-s3 = boto3.client("s3")
+from rds_bulk_loader import (
+    BATCH_SIZE,
+    ensure_emissions_table,
+    load_frames,
+    read_csv_chunks,
+    table_summary,
+)
+from rds_connection import ConnectionManager
 
-# rds settings
-user_name = ""
-password = ""
-rds_host = ""
-db_name = ""
+# upsert keeps one row per ship and reporting period, append adds the rows as they are
+write_mode = os.environ.get("RDS_WRITE_MODE", "upsert")
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# create the database connection outside of the handler to allow connections to be
-# re-used by subsequent function invocations.
-try:
-    conn = pymysql.connect(
-        host=rds_host, user=user_name, passwd=password, db=db_name, connect_timeout=5
-    )
-except pymysql.MySQLError as e:
-    logger.error("ERROR: Unexpected error: Could not connect to MySQL instance.")
-    logger.error(e)
-    sys.exit()
+# the connection is kept outside of the handler to be re-used by subsequent function invocations,
+# it is opened by the first invocation that needs it and checked before every reuse
+database = ConnectionManager()
 
-logger.info("SUCCESS: Connection to RDS MySQL instance succeeded")
+
+@functools.lru_cache(maxsize=None)
+def s3_client():
+    return boto3.client("s3")
+
+
+def parse_event(event) -> tuple:
+    """The bucket and the key of the object of an S3 event
+
+    Raises:
+        ValueError: if the event is not an S3 event
+    """
+    try:
+        s3_record = event["Records"][0]["s3"]
+        bucket = s3_record["bucket"]["name"]
+        key = urllib.parse.unquote_plus(s3_record["object"]["key"], encoding="utf-8")
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"Not an S3 event: {e!r}") from e
+
+    return bucket, key
 
 
 def lambda_handler(event, context):
@@ -38,41 +53,33 @@ def lambda_handler(event, context):
     """
     print("Received event: " + json.dumps(event, indent=2))
 
-    # Get the object from the event and show its content type
-    bucket = event["Records"][0]["s3"]["bucket"]["name"]
-    key = urllib.parse.unquote_plus(event["Records"][0]["s3"]["object"]["key"], encoding="utf-8")
+    # the event is checked before connecting, an invalid one does not open a connection
+    bucket, key = parse_event(event)
+    if not key.endswith(".csv"):
+        logger.info(f"Skipping {key}, only csv files are loaded")
+        return f"Skipped {key}"
 
-    item_count = 0
     try:
-        response = s3.get_object(Bucket=bucket, Key=key)
-
-        df = pd.read_csv(response["Body"])
-        df_small = df[
-            [
-                "IMO Number",
-                "Ship type",
-                "Total CO₂ emissions [m tonnes]",
-                "Reporting Period",
-                "Total fuel consumption [m tonnes]",
-            ]
-        ]
-        df_small = df_small.head(1000)
+        response = s3_client().get_object(Bucket=bucket, Key=key)
+
+        # the body is streamed in chunks of one batch, each written and committed on its own
+        chunks = read_csv_chunks(response["Body"], chunksize=BATCH_SIZE)
         print("Bulk adding to the table")
-        with conn.cursor() as cur:
-            for row in df_small.values:
-                row_tuple = tuple(row)
-                sql_string = f"INSERT INTO emissions(IMONumber, ShipType, TotalCO₂Emissions, ReportingPeriod, TotalFuelConsumption) VALUES ({row_tuple[0]}, '{row_tuple[1]}', '{row_tuple[2]}', '{row_tuple[3]}', '{row_tuple[4]}');"
-                cur.execute(sql_string)
-                conn.commit()
-
-            cur.execute("select * from emissions")
-            logger.info("The following items have been added to the database:")
-            for row in cur:
-                item_count += 1
-                logger.info(row)
-        conn.commit()
-
-        return "Added %d items to RDS MySQL table" % (item_count)
+        conn = database.connection()
+        ensure_emissions_table(conn, mode=write_mode)
+        stats = load_frames(conn, chunks, batch_size=BATCH_SIZE, mode=write_mode)
+        logger.info(
+            f"Wrote {stats['rows']} rows ({stats['affected']} changed) in {stats['batches']} "
+            f"batches in {stats['seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/s)"
+        )
+
+        summary = table_summary(conn)
+        logger.info(f"The table {summary['table']} has {summary['rows']} rows")
+
+        return "Wrote %d items to RDS MySQL table, it has %d rows" % (
+            stats["rows"],
+            summary["rows"],
+        )
 
     except Exception as e:
         print(e)
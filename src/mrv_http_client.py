@@ -0,0 +1,118 @@
+"""HTTP backend of the data acquisition
+
+The grid of the Thetis MRV page is filled by XHR calls returning JSON, so the metadata of the
+reports and the files themselves can be fetched directly, without running a browser. The endpoints
+are configured with environment variables since they are not part of a documented API:
+
+- MRV_API_URL: the base url of the endpoints, the HTTP backend is disabled when it is not set
+- MRV_REPORTS_PATH: the endpoint listing the reports, relative to the base url
+- MRV_FILE_PATH: the endpoint of a report file, with a {file} placeholder for its name
+
+All the requests go through one pooled urllib3 session, and the files are streamed in chunks to
+disk, where data_acquisition hashes them against the manifest before uploading them, so they
+are never held in memory.
+"""
+import json
+import logging
+import os
+from typing import List, Optional
+from urllib.parse import quote
+
+import urllib3
+from urllib3.response import HTTPResponse
+
+logger = logging.getLogger()
+
+MRV_API_URL = os.environ.get("MRV_API_URL")
+MRV_REPORTS_PATH = os.environ.get("MRV_REPORTS_PATH", "/reports")
+MRV_FILE_PATH = os.environ.get("MRV_FILE_PATH", "/reports/{file}")
+
+# the keys of a report in the JSON answer, by the column of the table on the page
+RECORD_FIELDS = {
+    "Reporting Period": "reportingPeriod",
+    "Version": "version",
+    "Generation Date": "generationDate",
+    "File": "fileName",
+}
+CHUNK_SIZE = 1 << 20
+
+
+class MRVHttpClient:
+    """Fetches the reports from the endpoints behind the Thetis MRV grid with one pooled session
+
+    Args:
+        base_url (Optional[str]): the base url of the endpoints, MRV_API_URL if None
+        maxsize (int): the number of connections kept open, one per concurrent download
+        timeout (float): the connect and read timeout of every request in seconds
+        retries (int): how many times a failed request or a 5xx answer is retried
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        maxsize: int = 4,
+        timeout: float = 30.0,
+        retries: int = 3,
+    ):
+        self.base_url = (base_url or MRV_API_URL or "").rstrip("/")
+        if not self.base_url:
+            raise ValueError("The MRV_API_URL of the HTTP backend is not set")
+
+        self.http = urllib3.PoolManager(
+            maxsize=maxsize,
+            block=True,
+            timeout=urllib3.Timeout(connect=timeout, read=timeout),
+            retries=urllib3.Retry(
+                total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504)
+            ),
+            headers={"Accept": "application/json", "X-Requested-With": "XMLHttpRequest"},
+        )
+
+    def _get(self, path: str, stream: bool = False) -> HTTPResponse:
+        response = self.http.request("GET", f"{self.base_url}{path}", preload_content=not stream)
+        if response.status != 200:
+            response.release_conn()
+            raise urllib3.exceptions.HTTPError(f"GET {path} answered {response.status}")
+
+        return response
+
+    def report_records(self) -> List[str]:
+        """Gets the reports in the text form of the rows of the grid, like
+        "Reporting Period2021\\nVersion3\\nGeneration Date01/01/2023\\nFile2021-v3", so they are
+        parsed by data_acquisition.extract_table_elements like the ones scraped from the page
+
+        Returns:
+            List[str]: one text per report
+        """
+        payload = json.loads(self._get(MRV_REPORTS_PATH).data)
+        records = payload["data"] if isinstance(payload, dict) else payload
+
+        return [
+            "\n".join(
+                f"{column}{record[key]}" for column, key in RECORD_FIELDS.items() if key in record
+            )
+            for record in records
+        ]
+
+    def _file_path(self, report: str) -> str:
+        return MRV_FILE_PATH.format(file=quote(report))
+
+    def download(self, report: str, directory: str) -> str:
+        """Streams a report to a file, under a temporary name until it is complete
+
+        Returns:
+            str: the path of the xlsx file
+        """
+        filepath = os.path.join(directory, f"{report}.xlsx")
+        partial = f"{filepath}.part"
+        response = self._get(self._file_path(report), stream=True)
+        try:
+            with open(partial, "wb") as file:
+                for chunk in response.stream(CHUNK_SIZE):
+                    file.write(chunk)
+        finally:
+            response.release_conn()
+
+        os.replace(partial, filepath)
+        logger.info(f"Downloaded {report} to {filepath}")
+        return filepath
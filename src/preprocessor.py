@@ -1,65 +1,288 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
-from typing import List
+from typing import Dict, List, Optional
 
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 
+from emissions_schema import apply_schema, process_technical_efficiency_values
+from ingestion_manifest import IngestionManifest
+from projection_plan import (
+    PLAN_PATH,
+    infer_projection_plan,
+    load_plan,
+    save_plan,
+)
+from xlsx_stream import file_sha256, iter_xlsx_batches
 
-def read_datasets_and_merge(files: List[str]) -> pd.DataFrame:
-    """Gets the list of files and merges them together
+
+def _normalise_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Makes a freshly parsed workbook storable as Parquet
+
+    The column names are stripped and the text columns that also hold numbers or dates, like the
+    "Division by zero!" cells of the emission columns, are turned to strings. It runs whether the
+    cache is used or not, so a cached workbook gives exactly the same frame as a parsed one.
+    """
+    df.columns = [str(column).strip() for column in df.columns]
+    for column in df.columns[df.dtypes == object]:
+        values = df[column]
+        if not values.dropna().map(type).eq(str).all():
+            df[column] = values.where(values.isna(), values.astype(str))
+
+    return df
+
+
+def _cache_path(
+    file: str, cache_dir: Optional[str], columns: Optional[List[str]] = None
+) -> Optional[str]:
+    if not cache_dir:
+        return None
+
+    key = file_sha256(file)
+    if columns is not None:
+        # a projected read is cached apart from the full one and from other projections
+        key += "-" + hashlib.sha256("\n".join(columns).encode()).hexdigest()[:16]
+
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+
+def read_dataset(
+    file: str, cache_dir: Optional[str] = None, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Reads one EU-MRV workbook, going through the Parquet cache when a cache directory is given
 
     Args:
-        files (List[str]):
+        file (str): the path of the xlsx file
+        cache_dir (Optional[str]): where the parsed workbooks are cached by the hash of their content
+        columns (Optional[List[str]]): the columns to read, usually the ones of the projection
+            plan, all of them if None
 
     Returns:
-        pd.DataFrame: _description_
+        pd.DataFrame: the content of the workbook
     """
-    df_list = (pd.read_excel(file, header=2) for file in files)
-    df = pd.concat(df_list, ignore_index=True)
+    cached = _cache_path(file, cache_dir, columns)
+    if cached and os.path.exists(cached):
+        return pd.read_parquet(cached)
+
+    # openpyxl read-only mode streams the sheet, instead of building the whole workbook in memory
+    batches = iter_xlsx_batches(file, header=2, columns=columns)
+    df = _normalise_frame(pd.concat(batches, ignore_index=True))
+
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write next to the final name and rename, a concurrent reader never sees a partial file
+        partial = f"{cached}.{os.getpid()}.partial"
+        df.to_parquet(partial, index=False)
+        os.replace(partial, cached)
 
     return df
 
 
-def remove_null_columns(df: pd.DataFrame) -> pd.DataFrame:
+def reconcile_schemas(frames: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    """Aligns the frames of the different years before they are concatenated
+
+    The columns missing from a year are added as nulls, in the order they are first seen, and a
+    column that is numeric in some years and text in others becomes text in all of them, so the
+    concat does not end up with a column of mixed objects.
+
+    Args:
+        frames (List[pd.DataFrame]): the frames of the workbooks
+
+    Returns:
+        List[pd.DataFrame]: the frames with the same columns and types
+    """
+    columns = list(dict.fromkeys(column for df in frames for column in df.columns))
+    frames = [df.reindex(columns=columns) for df in frames]
+
+    for column in columns:
+        present = [df[column] for df in frames if df[column].notna().any()]
+        if any(is_numeric_dtype(values) for values in present) and not all(
+            is_numeric_dtype(values) for values in present
+        ):
+            for df in frames:
+                values = df[column]
+                df[column] = values.where(values.isna(), values.astype(str))
+
+    return frames
+
+
+def read_datasets(
+    files: List[str],
+    max_workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+) -> List[pd.DataFrame]:
+    """Reads the workbooks and aligns their schemas
+
+    The workbooks found in the cache are loaded from their Parquet copy, the others are parsed in
+    parallel by a pool of processes since openpyxl only uses one core per file.
+
+    Args:
+        files (List[str]): the paths of the xlsx files
+        max_workers (Optional[int]): the number of processes parsing workbooks, one per core if None
+        cache_dir (Optional[str]): where the parsed workbooks are cached, no caching if None
+        columns (Optional[List[str]]): the columns to read from every file, all of them if None
+
+    Returns:
+        List[pd.DataFrame]: the rows of every file, in the order of the files, see reconcile_schemas
+    """
+    frames = {}
+    to_parse = []
+    for file in files:
+        cached = _cache_path(file, cache_dir, columns)
+        if cached and os.path.exists(cached):
+            frames[file] = pd.read_parquet(cached)
+        else:
+            to_parse.append(file)
+
+    if len(to_parse) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parsed = pool.map(
+                read_dataset, to_parse, [cache_dir] * len(to_parse), [columns] * len(to_parse)
+            )
+            frames.update(zip(to_parse, parsed))
+    else:
+        frames.update((file, read_dataset(file, cache_dir, columns)) for file in to_parse)
+
+    return reconcile_schemas([frames[file] for file in files])
+
+
+def read_datasets_and_merge(
+    files: List[str],
+    max_workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Gets the list of files and merges them together, see read_datasets for the arguments
+
+    Returns:
+        pd.DataFrame: the rows of all the files
+    """
+    frames = read_datasets(files, max_workers=max_workers, cache_dir=cache_dir, columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+
+    return df
+
+
+def remove_null_columns(df: pd.DataFrame, plan: Optional[Dict] = None) -> pd.DataFrame:
     """Gets the dataset, keeping the columns we want
 
+    Without a plan the columns with at least one null are dropped. With a projection plan the
+    columns it keeps are selected without scanning the values, since the files were profiled once
+    when the plan was built, and usually only these columns were read in the first place.
+
     Args:
-        df (pd.DataFrame): _description_
+        df (pd.DataFrame): the merged dataset
+        plan (Optional[Dict]): a plan from projection_plan.infer_projection_plan
 
     Returns:
-        pd.DataFrame: _description_
+        pd.DataFrame: the dataset with the columns that are always filled in
     """
+    if plan is not None:
+        return df[[column for column in plan["columns"] if column in df.columns]]
+
     df = df.loc[:, df.isnull().sum() == 0]
 
     return df
 
 
-def process_technical_efficiency_values(df: pd.DataFrame) -> pd.DataFrame:
-    """Gets the datasets, processes the technical efficiency column and splits it into two columns
-    one column for the type and one column for the value
+def process_frame(df: pd.DataFrame, plan: Dict) -> pd.DataFrame:
+    """Runs the steps of the preprocessing that follow the parsing on the rows of one workbook"""
+    df = remove_null_columns(df=df, plan=plan)
+    df = process_technical_efficiency_values(df=df)
+
+    return apply_schema(df)
+
+
+def process_file(file: str, plan: Dict, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """Runs all the steps of the preprocessing on one workbook, reading the columns of the plan"""
+    return process_frame(read_dataset(file, cache_dir=cache_dir, columns=plan["columns"]), plan)
+
+
+def period_output_path(output_dir: str, period: int) -> str:
+    return os.path.join(output_dir, f"reporting_period={int(period)}.parquet")
+
+
+def update_period_outputs(
+    files: List[str],
+    manifest: IngestionManifest,
+    output_dir: str,
+    plan: Dict,
+    cache_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> List[int]:
+    """Recomputes the outputs of the reporting periods whose workbooks changed
+
+    Every period is written to its own Parquet file. A workbook is processed again only when the
+    manifest has no record of its content being processed with the columns of the plan. The
+    changed workbooks are parsed together by read_datasets, in parallel and with aligned schemas.
 
     Args:
-        df (pd.DataFrame): _description_
+        files (List[str]): the paths of the xlsx files
+        manifest (IngestionManifest): where the processed workbooks are recorded
+        output_dir (str): the directory of the period outputs
+        plan (Dict): the projection plan of the workbooks
+        cache_dir (Optional[str]): where the parsed workbooks are cached, no caching if None
+        max_workers (Optional[int]): the number of processes parsing workbooks, one per core if None
 
     Returns:
-        pd.DataFrame: _description_
+        List[int]: the reporting periods that were recomputed
     """
+    os.makedirs(output_dir, exist_ok=True)
+    pending = [(file, file_sha256(file)) for file in files]
+    pending = [
+        (file, sha256)
+        for file, sha256 in pending
+        if not manifest.is_processed(sha256, plan["columns"])
+    ]
+    frames = read_datasets(
+        [file for file, _ in pending],
+        max_workers=max_workers,
+        cache_dir=cache_dir,
+        columns=plan["columns"],
+    )
 
-    for index, row in df.iterrows():
-        efficiency = row["Technical efficiency"]
+    changed = []
+    for (file, sha256), df in zip(pending, frames):
+        df = process_frame(df, plan)
+        for period, rows in df.groupby("Reporting Period", observed=True):
+            rows.to_parquet(period_output_path(output_dir, period), index=False)
+            changed.append(int(period))
+        manifest.mark_processed(sha256, df["Reporting Period"].unique(), plan["columns"])
 
-        type = efficiency.split()[0]
-        value = efficiency.split()[1].removeprefix("(")
+    return sorted(set(changed))
 
-        df.loc[index, "type"] = type
-        df.loc[index, "gCO₂/t·nm"] = value
 
-    return df
+def merge_period_outputs(output_dir: str) -> pd.DataFrame:
+    """Concatenates the outputs of all the periods into the dataset"""
+    files = sorted(glob(os.path.join(output_dir, "reporting_period=*.parquet")))
+    frames = reconcile_schemas([pd.read_parquet(file) for file in files])
+    # the categories differ from one period to the other, the schema is applied to the whole
+    return apply_schema(pd.concat(frames, ignore_index=True))
 
 
 def main():
     raw_path = "../data/raw/"
-    files = glob.glob(raw_path + "/*.xlsx")
+    cache_path = "../data/cache/"
+    periods_path = "../data/interim/periods/"
+    output_path = "../data/interim/ship_emissions_tracker_2018_2021.csv"
+    plan_path = os.path.join("..", PLAN_PATH)
+    files = sorted(glob(raw_path + "/*.xlsx"))
 
-    df = read_datasets_and_merge(files=files)
-    df = remove_null_columns(df=df)
-    df = process_technical_efficiency_values(df=df)
+    # the plan is refreshed for the new or changed files only, then just its columns are parsed
+    plan = infer_projection_plan(files, previous=load_plan(plan_path))
+    save_plan(plan, plan_path)
+
+    manifest = IngestionManifest(
+        os.environ.get("INGESTION_MANIFEST", "../data/interim/ingestion_manifest.json")
+    ).load()
+    changed = update_period_outputs(files, manifest, periods_path, plan, cache_dir=cache_path)
+    manifest.save()
+
+    if changed or not os.path.exists(output_path):
+        print(f"Recomputed the reporting periods {changed}")
+        merge_period_outputs(periods_path).to_csv(output_path, index=False)
+    else:
+        print("No reporting period changed")
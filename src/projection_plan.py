@@ -0,0 +1,147 @@
+"""Projection plan of the EU-MRV workbooks
+
+The plan is built by profiling every workbook once: for each column it records how many values
+are missing and which python types the cells hold. The columns that are filled in every row of
+every workbook, the ones remove_null_columns would keep, become the projection of the plan, so the
+preprocessor and the converter parse only those columns instead of dropping them after the fact.
+The profiles are keyed on the hash of the workbook, so only new or changed workbooks are profiled
+again when the plan is refreshed.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from typing import Dict, List, Optional
+
+from xlsx_stream import file_sha256, iter_xlsx_batches
+
+PLAN_PATH = "data/interim/projection_plan.json"
+
+
+def _type_name(value) -> str:
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "text"
+
+    return type(value).__name__
+
+
+def profile_file(path: str, header: int = 2, sample_rows: Optional[int] = None) -> Dict:
+    """Reads a workbook once and records the null count and the value types of its columns
+
+    Args:
+        path (str): the xlsx file
+        header (int): the row of the header
+        sample_rows (Optional[int]): stop after this many rows, the whole file if None
+
+    Returns:
+        Dict: the number of rows read and, for every column, its null count and types
+    """
+    rows = 0
+    columns = {}
+    for batch in iter_xlsx_batches(path, header=header):
+        if sample_rows is not None:
+            batch = batch.iloc[: sample_rows - rows]
+
+        for column in batch.columns:
+            profile = columns.setdefault(column, {"nulls": 0, "types": set()})
+            values = batch[column]
+            profile["nulls"] += int(values.isna().sum())
+            profile["types"].update(values.dropna().map(_type_name).unique())
+
+        rows += len(batch)
+        if sample_rows is not None and rows >= sample_rows:
+            break
+
+    return {
+        "rows": rows,
+        "columns": {
+            column: {"nulls": profile["nulls"], "types": sorted(profile["types"])}
+            for column, profile in columns.items()
+        },
+    }
+
+
+def infer_projection_plan(
+    files: List[str],
+    previous: Optional[Dict] = None,
+    sample_rows: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> Dict:
+    """Profiles the workbooks and derives the columns worth reading
+
+    Args:
+        files (List[str]): the xlsx files
+        previous (Optional[Dict]): an earlier plan, the workbooks it already profiled are reused
+        sample_rows (Optional[int]): profile only the first rows of every workbook
+        max_workers (Optional[int]): the number of processes profiling workbooks
+
+    Returns:
+        Dict: the profiles of the workbooks by hash and the projection under "columns" with the
+        types seen in each of these columns under "types"
+    """
+    known = (previous or {}).get("profiles", {})
+    hashes = {file: file_sha256(file) for file in files}
+    to_profile = [file for file in files if hashes[file] not in known]
+
+    profiles = {hashes[file]: known[hashes[file]] for file in files if hashes[file] in known}
+    if to_profile:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            new_profiles = pool.map(
+                profile_file, to_profile, [2] * len(to_profile), [sample_rows] * len(to_profile)
+            )
+            profiles.update(
+                (hashes[file], profile) for file, profile in zip(to_profile, new_profiles)
+            )
+
+    ordered = [profiles[hashes[file]] for file in files]
+    columns = [
+        column
+        for column in (ordered[0]["columns"] if ordered else {})
+        if all(
+            column in profile["columns"] and profile["columns"][column]["nulls"] == 0
+            for profile in ordered
+        )
+    ]
+    types = {
+        column: sorted({t for profile in ordered for t in profile["columns"][column]["types"]})
+        for column in columns
+    }
+
+    return {"profiles": profiles, "columns": columns, "types": types}
+
+
+def save_plan(plan: Dict, path: str = PLAN_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(plan, file, ensure_ascii=False, indent=2)
+
+
+def load_plan(path: str = PLAN_PATH) -> Optional[Dict]:
+    """Loads a saved plan, None when there is none yet"""
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the projection plan of the workbooks")
+    parser.add_argument("raw_dir", help="the directory with the xlsx files")
+    parser.add_argument("--output", default=PLAN_PATH, help="where to save the plan")
+    parser.add_argument("--sample-rows", type=int, default=None)
+    args = parser.parse_args()
+
+    files = sorted(glob(os.path.join(args.raw_dir, "*.xlsx")))
+    plan = infer_projection_plan(
+        files, previous=load_plan(args.output), sample_rows=args.sample_rows
+    )
+    save_plan(plan, args.output)
+    print(f"{len(plan['columns'])} columns to read from {len(files)} files, saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
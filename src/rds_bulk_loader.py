@@ -0,0 +1,252 @@
+"""Bulk loading of the emissions into the RDS database
+
+The rows are written with one parameterized INSERT per batch through executemany, which pymysql
+turns into multi-row INSERT statements, and every batch is committed as one transaction. It only
+relies on the DB-API, so the same code runs against MySQL with pymysql and against sqlite3.
+
+In the upsert mode a row replaces the one with the same IMO Number and Reporting Period, so
+loading the same csv again leaves the table as it was.
+"""
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+EMISSIONS_TABLE = "emissions"
+# the columns of the table by the columns of the csv
+EMISSIONS_COLUMNS = {
+    "IMONumber": "IMO Number",
+    "ShipType": "Ship type",
+    "TotalCO₂Emissions": "Total CO₂ emissions [m tonnes]",
+    "ReportingPeriod": "Reporting Period",
+    "TotalFuelConsumption": "Total fuel consumption [m tonnes]",
+}
+# the types the csv columns are read with, the measures can hold text like "Division by zero!"
+# so they are read as strings and converted chunk by chunk
+CSV_DTYPES = {
+    "IMO Number": "int64",
+    "Ship type": "string",
+    "Total CO₂ emissions [m tonnes]": "string",
+    "Reporting Period": "int16",
+    "Total fuel consumption [m tonnes]": "string",
+}
+NUMERIC_COLUMNS = ["Total CO₂ emissions [m tonnes]", "Total fuel consumption [m tonnes]"]
+
+# a ship has one row per reporting period
+EMISSIONS_KEY = ("IMONumber", "ReportingPeriod")
+UNIQUE_KEY = "uq_emissions_ship_period"
+BATCH_SIZE = int(os.environ.get("RDS_BATCH_SIZE", 5000))
+WRITE_MODES = ("append", "upsert")
+
+EMISSIONS_DDL = {
+    "mysql": [
+        """CREATE TABLE IF NOT EXISTS `emissions` (
+            `IMONumber` INT NOT NULL,
+            `ShipType` VARCHAR(64) NOT NULL,
+            `TotalCO₂Emissions` DOUBLE NULL,
+            `ReportingPeriod` SMALLINT NOT NULL,
+            `TotalFuelConsumption` DOUBLE NULL,
+            UNIQUE KEY `uq_emissions_ship_period` (`IMONumber`, `ReportingPeriod`),
+            KEY `ix_emissions_ship_type` (`ShipType`)
+        ) DEFAULT CHARSET=utf8mb4""",
+    ],
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS `emissions` (
+            `IMONumber` INTEGER NOT NULL,
+            `ShipType` TEXT NOT NULL,
+            `TotalCO₂Emissions` REAL NULL,
+            `ReportingPeriod` INTEGER NOT NULL,
+            `TotalFuelConsumption` REAL NULL
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS `uq_emissions_ship_period` "
+        "ON `emissions` (`IMONumber`, `ReportingPeriod`)",
+        "CREATE INDEX IF NOT EXISTS `ix_emissions_ship_type` ON `emissions` (`ShipType`)",
+    ],
+}
+
+
+def dialect(conn) -> str:
+    return "sqlite" if isinstance(conn, sqlite3.Connection) else "mysql"
+
+
+def placeholder(conn) -> str:
+    """The parameter marker of the driver, sqlite3 uses the qmark style and pymysql the format one"""
+    return "?" if dialect(conn) == "sqlite" else "%s"
+
+
+def insert_statement(
+    conn, table: str, columns: List[str], mode: str = "append", key: tuple = EMISSIONS_KEY
+) -> str:
+    """The parameterized INSERT of one row, backticks quote the names in MySQL and in SQLite
+
+    In the upsert mode the row updates the one with the same key, with ON DUPLICATE KEY UPDATE
+    in MySQL and ON CONFLICT in SQLite, which needs a unique index on the key in both.
+    """
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Unknown write mode {mode}, use one of {WRITE_MODES}")
+
+    names = ", ".join(f"`{column}`" for column in columns)
+    markers = ", ".join([placeholder(conn)] * len(columns))
+    sql = f"INSERT INTO `{table}` ({names}) VALUES ({markers})"
+    if mode == "append":
+        return sql
+
+    updated = [column for column in columns if column not in key]
+    if dialect(conn) == "sqlite":
+        conflict = ", ".join(f"`{column}`" for column in key)
+        updates = ", ".join(f"`{column}` = excluded.`{column}`" for column in updated)
+        return f"{sql} ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+
+    updates = ", ".join(f"`{column}` = VALUES(`{column}`)" for column in updated)
+    return f"{sql} ON DUPLICATE KEY UPDATE {updates}"
+
+
+def has_unique_key(conn, table: str = EMISSIONS_TABLE, key: str = UNIQUE_KEY) -> bool:
+    """Whether the table has the unique index named key, with SHOW INDEX in MySQL and
+    PRAGMA index_list in SQLite
+    """
+    cur = conn.cursor()
+    try:
+        if dialect(conn) == "sqlite":
+            cur.execute(f"PRAGMA index_list(`{table}`)")
+            return any(row[1] == key and row[2] for row in cur.fetchall())
+
+        cur.execute(f"SHOW INDEX FROM `{table}` WHERE Key_name = %s AND Non_unique = 0", (key,))
+        return cur.fetchone() is not None
+    finally:
+        cur.close()
+
+
+def ensure_emissions_table(conn, mode: str = "append"):
+    """Creates the emissions table with its unique key and indexes when it does not exist
+
+    A table created before the key existed has to be deduplicated and given the key by hand,
+    ALTER TABLE emissions ADD UNIQUE KEY uq_emissions_ship_period (IMONumber, ReportingPeriod)
+
+    Raises:
+        RuntimeError: in the upsert mode, if the existing table does not have the unique key,
+            the upsert would then only add the rows again
+    """
+    cur = conn.cursor()
+    try:
+        for statement in EMISSIONS_DDL[dialect(conn)]:
+            cur.execute(statement)
+        conn.commit()
+    finally:
+        cur.close()
+
+    if mode == "upsert" and not has_unique_key(conn):
+        raise RuntimeError(
+            f"The table {EMISSIONS_TABLE} has no unique key {UNIQUE_KEY} on {EMISSIONS_KEY}, add "
+            f"it before upserting: ALTER TABLE {EMISSIONS_TABLE} ADD UNIQUE KEY {UNIQUE_KEY} "
+            f"({', '.join(EMISSIONS_KEY)})"
+        )
+
+
+def table_summary(conn, table: str = EMISSIONS_TABLE) -> Dict:
+    """Counts the rows of the table, instead of reading them back"""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT COUNT(*) FROM `{table}`")
+        return {"table": table, "rows": cur.fetchone()[0]}
+    finally:
+        cur.close()
+
+
+def read_csv_chunks(
+    source,
+    columns: Optional[Dict[str, str]] = None,
+    chunksize: int = BATCH_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """Reads a csv in chunks, parsing only the columns that are loaded
+
+    The memory used depends on the size of the chunks and not on the size of the file, so a
+    Lambda reading the body of an S3 object does not have to be sized for the largest year.
+
+    Args:
+        source: a path or a file object, like the StreamingBody of get_object
+        columns (Optional[Dict[str, str]]): the columns of the table by the columns of the csv,
+            EMISSIONS_COLUMNS if None
+        chunksize (int): the number of rows of a chunk
+
+    Yields:
+        pd.DataFrame: the rows of the chunk with the measures as floats
+    """
+    usecols = list((columns or EMISSIONS_COLUMNS).values())
+    dtype = {column: CSV_DTYPES[column] for column in usecols if column in CSV_DTYPES}
+
+    for chunk in pd.read_csv(source, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        for column in NUMERIC_COLUMNS:
+            if column in chunk:
+                chunk[column] = pd.to_numeric(chunk[column], errors="coerce")
+        yield chunk
+
+
+def to_records(df: pd.DataFrame) -> List[tuple]:
+    """Converts the rows to tuples of python values, the missing values become NULL"""
+    values = df.astype(object).where(df.notna(), None)
+    return [
+        tuple(value.item() if isinstance(value, np.generic) else value for value in row)
+        for row in values.itertuples(index=False, name=None)
+    ]
+
+
+def load_frames(
+    conn,
+    frames: Iterable[pd.DataFrame],
+    table: str = EMISSIONS_TABLE,
+    columns: Optional[Dict[str, str]] = None,
+    batch_size: int = BATCH_SIZE,
+    mode: str = "append",
+) -> Dict:
+    """Inserts the rows of the frames in batches, one transaction per batch
+
+    Args:
+        conn: a DB-API connection, pymysql or sqlite3
+        frames (Iterable[pd.DataFrame]): the rows to load, like the chunks of a csv
+        table (str): the table the rows are inserted into
+        columns (Optional[Dict[str, str]]): the columns of the table by the columns of the frames,
+            EMISSIONS_COLUMNS if None
+        batch_size (int): the number of rows of a batch
+        mode (str): append adds the rows, upsert replaces the rows with the same EMISSIONS_KEY
+
+    Returns:
+        Dict: the rows and batches written, the rows the database reports as changed, the
+        seconds it took and the rows per second
+    """
+    columns = columns or EMISSIONS_COLUMNS
+    sql = insert_statement(conn, table, list(columns), mode)
+    rows = 0
+    affected = 0
+    batches = 0
+    start = time.perf_counter()
+
+    for frame in frames:
+        frame = frame[list(columns.values())]
+        for offset in range(0, len(frame), batch_size):
+            records = to_records(frame.iloc[offset:][:batch_size])
+            cur = conn.cursor()
+            try:
+                cur.executemany(sql, records)
+                conn.commit()
+                affected += max(cur.rowcount, 0)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+            rows += len(records)
+            batches += 1
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "batches": batches,
+        "affected": affected,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else float(rows),
+    }
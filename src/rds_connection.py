@@ -0,0 +1,82 @@
+"""Connection to the RDS database reused by the warm invocations of a Lambda
+
+The connection is only opened when an invocation needs it, so a cold start that fails before
+touching the database does not pay for it, and it is checked with a ping every time it is reused,
+so a connection dropped while the container was idle is opened again instead of failing. The
+settings come from the environment:
+
+- RDS_PROXY_HOST: the endpoint of an RDS Proxy pooling the connections, used instead of RDS_HOST
+- RDS_HOST, RDS_PORT, RDS_USER, RDS_PASSWORD, RDS_DB_NAME: the database
+- RDS_CONNECT_TIMEOUT, RDS_READ_TIMEOUT, RDS_WRITE_TIMEOUT: the timeouts in seconds
+"""
+import logging
+import os
+from typing import Callable, Dict, Optional
+
+import pymysql
+
+logger = logging.getLogger()
+
+
+def connection_settings() -> Dict:
+    """The arguments of pymysql.connect from the environment"""
+    return {
+        "host": os.environ.get("RDS_PROXY_HOST") or os.environ.get("RDS_HOST", ""),
+        "port": int(os.environ.get("RDS_PORT", 3306)),
+        "user": os.environ.get("RDS_USER", ""),
+        "password": os.environ.get("RDS_PASSWORD", ""),
+        "database": os.environ.get("RDS_DB_NAME", ""),
+        "connect_timeout": int(os.environ.get("RDS_CONNECT_TIMEOUT", 5)),
+        "read_timeout": int(os.environ.get("RDS_READ_TIMEOUT", 60)),
+        "write_timeout": int(os.environ.get("RDS_WRITE_TIMEOUT", 60)),
+        "charset": "utf8mb4",
+    }
+
+
+class ConnectionManager:
+    """Opens the connection on first use and checks it on every reuse
+
+    Args:
+        connect (Optional[Callable]): opens a new connection, pymysql.connect with
+            connection_settings() if None
+    """
+
+    def __init__(self, connect: Optional[Callable] = None):
+        self._connect = connect or (lambda: pymysql.connect(**connection_settings()))
+        self._conn = None
+
+    def _is_alive(self) -> bool:
+        try:
+            if hasattr(self._conn, "ping"):
+                # pymysql reconnects the same connection object when the ping fails
+                self._conn.ping(reconnect=True)
+            else:
+                self._conn.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"The database connection was dropped: {e}")
+            return False
+
+    def connection(self):
+        """The open connection, opened or opened again when needed
+
+        Raises:
+            pymysql.MySQLError: if the database cannot be reached
+        """
+        if self._conn is not None and self._is_alive():
+            return self._conn
+
+        self.close()
+        self._conn = self._connect()
+        logger.info("SUCCESS: Connection to RDS MySQL instance succeeded")
+        return self._conn
+
+    def close(self):
+        if self._conn is None:
+            return
+
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetReloader:
+    """Reloads the dataset of the API in a background thread.
+
+    The thread checks the version of the data file every `interval` seconds, or as soon as
+    `trigger` is called, and when it changed it builds a new store with `load` and hands it to
+    `swap`. The requests keep reading the store they started with, so the swap never affects a
+    request in flight and the old store is freed once the last of them finishes.
+
+    Every worker process has its own reloader. `trigger` touches the `marker` file they all watch,
+    checked every `marker_interval` seconds even when `interval` is None, so a reload asked to
+    one worker reaches all of them.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], Any],
+        swap: Callable[[Any], None],
+        current_version: Callable[[], str],
+        interval: Optional[float] = 30.0,
+        marker: Optional[str] = None,
+        marker_interval: float = 1.0,
+    ):
+        self.load = load
+        self.swap = swap
+        self.current_version = current_version
+        self.interval = interval or None
+        self.marker = marker
+        self.marker_interval = marker_interval
+        self.version = None
+        self._marker_version = None
+        self._trigger = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, version: str):
+        """Starts watching for new versions, `version` is the one already loaded"""
+        self.version = version
+        self._marker_version = self._read_marker()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dataset-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._trigger.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def trigger(self):
+        """Asks the thread, and the reloaders watching the same marker, to reload the dataset now,
+        even if its version did not change
+        """
+        if self.marker is not None:
+            os.makedirs(os.path.dirname(self.marker) or ".", exist_ok=True)
+            with open(self.marker, "a"):
+                os.utime(self.marker)
+        self._trigger.set()
+
+    def _read_marker(self) -> Optional[int]:
+        try:
+            return os.stat(self.marker).st_mtime_ns if self.marker is not None else None
+        except FileNotFoundError:
+            return None
+
+    def _run(self):
+        checked = time.monotonic()
+        while not self._stop.is_set():
+            forced = self._trigger.wait(self.marker_interval if self.marker else self.interval)
+            self._trigger.clear()
+            if self._stop.is_set():
+                break
+
+            marker_version = self._read_marker()
+            if marker_version != self._marker_version:
+                self._marker_version = marker_version
+                forced = True
+
+            due = self.interval is not None and time.monotonic() - checked >= self.interval
+            if due:
+                checked = time.monotonic()
+
+            try:
+                if forced or (due and self.current_version() != self.version):
+                    self.reload()
+            except Exception:
+                logger.exception("Could not reload the dataset, the current version is kept")
+
+    def reload(self):
+        with self._lock:
+            logger.info("Loading a new version of the dataset")
+            store = self.load()
+            self.swap(store)
+            self.version = store.version
+            logger.info(f"Swapped in version {store.version} of the dataset")
@@ -0,0 +1,128 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from api_decorators import EnvelopeResponse
+from streaming import negotiate_stream_format
+
+
+class CachedResponse(NamedTuple):
+    data: Optional[bytes]
+    message: str
+    status_code: int
+    etag: str
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks the If-None-Match header of a request against the ETag of a cached body"""
+    if not if_none_match:
+        return False
+
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCache:
+    """Bounded LRU cache of the rendered data of the API responses.
+
+    Entries are keyed on the dataset version, the path and the query parameters of the request, so
+    a new version of the data makes all the previous entries unreachable. Only the data is cached,
+    the envelope with the timestamp and the url is built for every response. The ETag of an entry
+    is a weak one, the hash of its data, and a request with a matching If-None-Match gets a 304
+    straight from the cache, without running the endpoint.
+    """
+
+    def __init__(self, maxsize: int = 1024, max_age: int = 300):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_version(self, version: str):
+        """Switches the cache to a new version of the dataset and drops the old entries"""
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._entries.clear()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _response(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={self.max_age}"}
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+
+        return EnvelopeResponse(
+            request, entry.message, entry.status_code, entry.data, headers=headers
+        )
+
+    def cached(self, f):
+        """Caches the Response returned by an endpoint decorated with construct_response.
+        Streaming requests and error responses go straight to the endpoint.
+        """
+
+        @wraps(f)
+        def wrap(request: Request, *args, **kwargs) -> Response:
+            if negotiate_stream_format(request.headers.get("accept")) is not None:
+                return f(request, *args, **kwargs)
+
+            key = (
+                self.version,
+                request.url.path,
+                tuple(sorted(request.query_params.multi_items())),
+            )
+            entry = self.get(key)
+            if entry is None:
+                response = f(request, *args, **kwargs)
+                if response.status_code != 200 or not isinstance(response, EnvelopeResponse):
+                    return response
+
+                # the envelope differs from one request to the other, the ETag only covers the data
+                digest = hashlib.blake2b(response.data or b"", digest_size=16).hexdigest()
+                entry = CachedResponse(
+                    data=response.data,
+                    message=response.message,
+                    status_code=response.status_code,
+                    etag=f'W/"{digest}"',
+                )
+                self.put(key, entry)
+
+            return self._response(request, entry)
+
+        return wrap
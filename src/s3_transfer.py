@@ -0,0 +1,281 @@
+"""Uploads to S3 shared by the data acquisition
+
+All the uploads go through one pooled client and a TransferConfig read from the environment:
+
+- S3_MULTIPART_THRESHOLD_MB: the size from which a file is sent as a multipart upload (8)
+- S3_MULTIPART_CHUNKSIZE_MB: the size of the parts (8)
+- S3_MAX_CONCURRENCY: the number of parts of one upload sent at the same time (10)
+- S3_UPLOAD_ATTEMPTS: how many times a failed upload is started again (4)
+
+File objects are streamed as they are read, without a local copy. Every upload is verified
+against the object S3 stored: its size and its ETag, which is the MD5 of the content or, for a
+multipart upload, the MD5 of the MD5s of the parts. The SHA-256 of a file is also stored in the
+metadata of its object.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger()
+
+MB = 1024 * 1024
+UPLOAD_ATTEMPTS = int(os.environ.get("S3_UPLOAD_ATTEMPTS", 4))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+
+
+class ChecksumMismatch(Exception):
+    """The object stored in S3 is not the content that was sent"""
+
+
+# the errors of a failed upload, upload_file and upload_fileobj wrap the ClientError of the
+# transfer in an S3UploadFailedError
+UPLOAD_ERRORS = (BotoCoreError, ClientError, S3UploadFailedError, ChecksumMismatch)
+
+
+def transfer_config() -> TransferConfig:
+    """The multipart settings of the uploads, from the S3_* environment variables"""
+    return TransferConfig(
+        multipart_threshold=int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", 8)) * MB,
+        multipart_chunksize=int(os.environ.get("S3_MULTIPART_CHUNKSIZE_MB", 8)) * MB,
+        max_concurrency=int(os.environ.get("S3_MAX_CONCURRENCY", 10)),
+    )
+
+
+def create_s3_client(max_workers: int = 1, config: Optional[TransferConfig] = None):
+    """One client shared by all the uploads, boto3 clients are thread safe and keep a connection
+    pool, which has to hold a connection for every part sent at the same time by every thread
+
+    Args:
+        max_workers (int): the number of threads uploading with the client
+        config (Optional[TransferConfig]): the settings of the uploads, transfer_config() if None
+    """
+    config = config or transfer_config()
+    return boto3.client(
+        "s3",
+        region_name="us-east-1",
+        config=Config(
+            max_pool_connections=max(max_workers * config.max_concurrency, 10),
+            retries={"max_attempts": 5, "mode": "adaptive"},
+        ),
+    )
+
+
+class ProgressLogger:
+    """Logs the progress of an upload every tenth of its size, or every 50 MB when the size of
+    a stream is not known. s3transfer calls it from the threads sending the parts
+    """
+
+    def __init__(self, name: str, size: Optional[int] = None):
+        self.name = name
+        self.size = size
+        self.sent = 0
+        self.step = max(size // 10, 1) if size else 50 * MB
+        self.next_report = self.step
+        self._lock = threading.Lock()
+
+    def __call__(self, bytes_amount: int):
+        with self._lock:
+            self.sent += bytes_amount
+            if self.sent < self.next_report:
+                return
+            self.next_report += self.step
+            total = f" of {self.size / MB:.1f} MB" if self.size else ""
+            logger.info(f"Uploading {self.name}: {self.sent / MB:.1f} MB{total}")
+
+
+class _HashingReader:
+    """Wraps a file object to compute the checksums of what s3transfer reads from it
+
+    The MD5s are kept per part of chunk_size bytes, since a stream is cut in parts of exactly
+    that size, so the ETag of a multipart upload can be computed too
+    """
+
+    def __init__(self, fileobj, chunk_size: int):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.part_md5s = [hashlib.md5()]
+        self._part_size = 0
+
+    def read(self, amount: int = -1) -> bytes:
+        data = self.fileobj.read(amount)
+        self.size += len(data)
+        self.sha256.update(data)
+
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            if self._part_size == self.chunk_size:
+                self.part_md5s.append(hashlib.md5())
+                self._part_size = 0
+            taken = min(len(data) - offset, self.chunk_size - self._part_size)
+            self.part_md5s[-1].update(view[offset:][:taken])
+            self._part_size += taken
+            offset += taken
+
+        return data
+
+    def etag(self, multipart: bool) -> str:
+        if not multipart:
+            return f'"{self.part_md5s[0].hexdigest()}"'
+
+        combined = hashlib.md5(b"".join(md5.digest() for md5 in self.part_md5s))
+        return f'"{combined.hexdigest()}-{len(self.part_md5s)}"'
+
+
+def file_checksums(path: str, chunk_size: int) -> _HashingReader:
+    """Reads a file once to get its size, SHA-256 and the MD5s of its parts"""
+    with open(path, "rb") as file:
+        reader = _HashingReader(file, chunk_size)
+        while reader.read(MB):
+            pass
+
+    return reader
+
+
+def verify_upload(
+    s3_client, bucket: str, key: str, checksums: _HashingReader, config: TransferConfig
+):
+    """Compares the object stored in S3 with the checksums of the content that was sent
+
+    Raises:
+        ChecksumMismatch: if the size or the ETag of the object are not the expected ones
+    """
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    if head["ContentLength"] != checksums.size:
+        raise ChecksumMismatch(
+            f"s3://{bucket}/{key} has {head['ContentLength']} bytes, {checksums.size} were sent"
+        )
+
+    # with SSE-KMS the ETag is not a digest of the content, the size is all that can be checked
+    if head.get("ServerSideEncryption") == "aws:kms":
+        return head
+
+    expected = checksums.etag(multipart=checksums.size >= config.multipart_threshold)
+    if head["ETag"] != expected:
+        raise ChecksumMismatch(f"s3://{bucket}/{key} has the ETag {head['ETag']}, not {expected}")
+
+    return head
+
+
+def _with_retries(upload: Callable[[], Dict], name: str, attempts: int) -> Dict:
+    """Runs an upload until it succeeds, sleeping with full jitter exponential backoff between
+    the attempts so the threads retrying at the same time do not hit S3 together
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return upload()
+        except UPLOAD_ERRORS as e:
+            if attempt == attempts:
+                raise
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+            logger.warning(
+                f"Upload of {name} failed ({e}), attempt {attempt}, retry in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+
+def upload_file(
+    path: str,
+    bucket: str,
+    key: str,
+    s3_client=None,
+    config: Optional[TransferConfig] = None,
+    attempts: int = UPLOAD_ATTEMPTS,
+) -> Dict:
+    """Uploads a file, with its SHA-256 in the metadata of the object, and verifies it
+
+    Args:
+        path (str): the file to upload
+        bucket (str): the bucket
+        key (str): the name of the object
+        s3_client: the shared client, see create_s3_client
+        config (Optional[TransferConfig]): the multipart settings, transfer_config() if None
+        attempts (int): how many times the upload is tried
+
+    Returns:
+        Dict: the bucket, key, size, sha256 and etag of the object
+    """
+    config = config or transfer_config()
+    s3_client = s3_client or create_s3_client(config=config)
+    checksums = file_checksums(path, config.multipart_chunksize)
+    sha256 = checksums.sha256.hexdigest()
+
+    def upload():
+        s3_client.upload_file(
+            path,
+            bucket,
+            key,
+            ExtraArgs={"Metadata": {"sha256": sha256}},
+            Config=config,
+            Callback=ProgressLogger(key, checksums.size),
+        )
+        head = verify_upload(s3_client, bucket, key, checksums, config)
+        return {
+            "bucket": bucket,
+            "key": key,
+            "size": checksums.size,
+            "sha256": sha256,
+            "etag": head["ETag"],
+        }
+
+    return _with_retries(upload, key, attempts)
+
+
+def upload_fileobj(
+    fileobj,
+    bucket: str,
+    key: str,
+    s3_client=None,
+    config: Optional[TransferConfig] = None,
+    attempts: int = UPLOAD_ATTEMPTS,
+) -> Dict:
+    """Streams a file object to S3 as it is read, like the body of an HTTP response, and verifies
+    the object against the checksums computed on the way
+
+    A failed upload is only tried again when the file object can be rewound, a stream that was
+    partly consumed cannot be sent a second time.
+
+    Args:
+        fileobj: a binary file object
+        bucket (str): the bucket
+        key (str): the name of the object
+        s3_client: the shared client, see create_s3_client
+        config (Optional[TransferConfig]): the multipart settings, transfer_config() if None
+        attempts (int): how many times the upload is tried
+
+    Returns:
+        Dict: the bucket, key, size, sha256 and etag of the object
+    """
+    config = config or transfer_config()
+    s3_client = s3_client or create_s3_client(config=config)
+    seekable = getattr(fileobj, "seekable", lambda: False)()
+    start = fileobj.tell() if seekable else None
+
+    def upload():
+        if seekable:
+            fileobj.seek(start)
+        reader = _HashingReader(fileobj, config.multipart_chunksize)
+        s3_client.upload_fileobj(reader, bucket, key, Config=config, Callback=ProgressLogger(key))
+        head = verify_upload(s3_client, bucket, key, reader, config)
+        return {
+            "bucket": bucket,
+            "key": key,
+            "size": reader.size,
+            "sha256": reader.sha256.hexdigest(),
+            "etag": head["ETag"],
+        }
+
+    return _with_retries(upload, key, attempts if seekable else 1)
@@ -0,0 +1,99 @@
+import argparse
+import logging
+import os
+import time
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from emissions_schema import (
+    apply_schema,
+    footprint_report,
+    process_technical_efficiency_values,
+)
+
+CSV_PATH = "data/interim/ship_emissions_tracker_2018_2021.csv"
+SNAPSHOT_PATH = "data/interim/ship_emissions_tracker_2018_2021.arrow"
+
+logger = logging.getLogger(__name__)
+
+
+def csv_to_snapshot(csv_path: str = CSV_PATH, snapshot_path: str = SNAPSHOT_PATH) -> pa.Table:
+    """Converts the interim csv into a typed Arrow IPC file that the API can memory-map
+    The technical efficiency is parsed once here into its type and value columns and the columns
+    get the canonical types of emissions_schema, stored as dictionaries, float32 and small ints.
+
+    The file is written uncompressed on purpose: compressed buffers would have to be decoded
+    into private memory by every worker, while plain buffers can be mapped straight from the
+    page cache and shared between the processes on the same host.
+
+    Args:
+        csv_path (str): the interim csv with the data of all the reporting periods
+        snapshot_path (str): where the Arrow file is written
+
+    Returns:
+        pa.Table: the table that was written to disk
+    """
+    raw = pd.read_csv(csv_path)
+    df = apply_schema(process_technical_efficiency_values(raw))
+    logger.info(footprint_report(raw, df))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # the running workers map the current file, rewriting it in place would change the pages
+    # under them, so the new file is written next to it and renamed over it
+    partial = f"{snapshot_path}.partial"
+    with pa.OSFile(partial, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(partial, snapshot_path)
+
+    return table
+
+
+def dataset_version(path: str) -> str:
+    """Identifies the version of a data file from its modification time and size"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def load_snapshot(
+    snapshot_path: str = SNAPSHOT_PATH, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Memory-maps the Arrow snapshot and returns it as a DataFrame
+
+    Args:
+        snapshot_path (str): the Arrow IPC file written by csv_to_snapshot
+        columns (Optional[List[str]]): the columns to load, all of them if None
+
+    Returns:
+        pd.DataFrame: the dataset with the types stored in the snapshot
+    """
+    with pa.memory_map(snapshot_path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    if columns is not None:
+        table = table.select(columns)
+
+    # split_blocks keeps pandas from consolidating the columns into new 2D blocks, so the
+    # numeric columns without nulls stay views on the mapped buffers instead of being copied
+    return table.to_pandas(split_blocks=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Arrow snapshot used by the API")
+    parser.add_argument("--csv", default=CSV_PATH, help="the interim csv to convert")
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help="where to write the snapshot")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    start = time.perf_counter()
+    table = csv_to_snapshot(csv_path=args.csv, snapshot_path=args.output)
+    print(
+        f"Wrote {table.num_rows} rows and {table.num_columns} columns to {args.output} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
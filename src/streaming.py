@@ -0,0 +1,145 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+from fastapi.responses import StreamingResponse
+
+from api_decorators import render_json
+from data_store import EmissionsStore, to_split_dict
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+STREAM_BATCH_SIZE = 5000
+
+# The batches of the exports are rendered in their own bounded pool, so a few slow exports can
+# only hold these threads and never the ones serving the other endpoints
+export_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("EXPORT_THREADS", 4)), thread_name_prefix="export"
+)
+
+
+def negotiate_stream_format(accept: Optional[str]) -> Optional[str]:
+    """Picks the streaming media type asked for in the Accept header
+
+    Args:
+        accept (Optional[str]): the value of the Accept header of the request
+
+    Returns:
+        Optional[str]: one of the streaming media types, or None when the client wants plain JSON
+    """
+    if not accept:
+        return None
+
+    for media_range in accept.split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in (NDJSON_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE):
+            return media_type
+
+    return None
+
+
+def iter_ndjson(
+    store: EmissionsStore,
+    positions: np.ndarray,
+    columns: List[str],
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Yields the rows at the given positions as newline delimited JSON, one batch at a time
+
+    The records are rendered like the JSON body, see to_split_dict, so the floats and the dates
+    are written the same way in both.
+    """
+    for start in range(0, len(positions), batch_size):
+        split = to_split_dict(store.rows(positions[start:][:batch_size], columns))
+        yield b"".join(
+            render_json(dict(zip(split["columns"], row))) + b"\n" for row in split["data"]
+        )
+
+
+class _ChunkSink:
+    """Minimal writable file object that hands over what the Arrow writer has produced so far"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_arrow_stream(
+    store: EmissionsStore,
+    positions: np.ndarray,
+    columns: List[str],
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Yields the rows at the given positions in the Arrow IPC streaming format
+
+    The schema message is sent first and every batch of rows becomes one record batch message,
+    so the client can start decoding before the whole collection has been read.
+    """
+    schema = pa.schema([store.arrow_schema.field(column) for column in columns])
+    sink = _ChunkSink()
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for start in range(0, len(positions), batch_size):
+            batch = store.rows(positions[start:][:batch_size], columns)
+            writer.write_batch(
+                pa.RecordBatch.from_pandas(batch, schema=schema, preserve_index=False)
+            )
+            yield sink.drain()
+
+    yield sink.drain()
+
+
+async def _iterate_in_executor(iterator: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Pulls the chunks of a sync iterator from the export pool"""
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        chunk = await loop.run_in_executor(export_executor, next, iterator, done)
+        if chunk is done:
+            break
+        yield chunk
+
+
+def stream_response(
+    store: EmissionsStore,
+    media_type: str,
+    positions: np.ndarray,
+    columns: List[str],
+    next_cursor: Optional[str] = None,
+) -> StreamingResponse:
+    """Builds the streaming response for the rows at the given positions
+
+    Args:
+        store (EmissionsStore): the store holding the dataset
+        media_type (str): one of the media types returned by negotiate_stream_format
+        positions (np.ndarray): the row positions to stream
+        columns (List[str]): the columns to stream
+        next_cursor (Optional[str]): the cursor of the next page, sent in the X-Next-Cursor header
+
+    Returns:
+        StreamingResponse: response that writes the batches as they are produced
+    """
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        body = iter_arrow_stream(store, positions, columns)
+    else:
+        body = iter_ndjson(store, positions, columns)
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+    return StreamingResponse(_iterate_in_executor(body), media_type=media_type, headers=headers)
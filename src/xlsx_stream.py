@@ -0,0 +1,287 @@
+import csv
+import hashlib
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+BATCH_SIZE = 10000
+
+TypeLookup = Optional[Union[Dict[str, pa.DataType], Callable[[str], Optional[pa.DataType]]]]
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hashes the content of a file without loading it all in memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _column_names(header: tuple) -> List[str]:
+    """Names the columns like pd.read_excel does, for unnamed and duplicated headers"""
+    names = []
+    seen = {}
+    for position, value in enumerate(header):
+        name = str(value).strip() if value is not None else f"Unnamed: {position}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+
+    return names
+
+
+def iter_xlsx_batches(
+    path: str,
+    header: int = 2,
+    batch_size: int = BATCH_SIZE,
+    columns: Optional[List[str]] = None,
+    sheet_name: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Reads a workbook row by row and yields it in batches
+
+    The workbook is opened in openpyxl read-only mode, which parses the sheet XML as a stream, so
+    the memory used only depends on the size of the batches and not on the size of the file.
+
+    Args:
+        path (str): the xlsx file
+        header (int): the row of the header, 2 for the EU-MRV workbooks like pd.read_excel(header=2)
+        batch_size (int): the number of rows in a batch
+        columns (Optional[List[str]]): the columns to keep, all of them if None
+        sheet_name (Optional[str]): the sheet to read, the first one if None
+
+    Yields:
+        pd.DataFrame: the rows of the batch with the types of the cells
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        # some writers store wrong dimensions, without them openpyxl reads every row it finds
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+
+        for _ in range(header):
+            next(rows, None)
+        names = _column_names(next(rows, ()))
+
+        if columns is None:
+            positions = list(range(len(names)))
+        else:
+            missing = set(columns) - set(names)
+            if missing:
+                raise ValueError(f"Columns not found in {path}: {sorted(missing)}")
+            positions = [names.index(column) for column in columns]
+        selected = [names[position] for position in positions]
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(tuple(row[p] if p < len(row) else None for p in positions))
+            if len(batch) == batch_size:
+                yield pd.DataFrame.from_records(batch, columns=selected)
+                batch = []
+
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=selected)
+    finally:
+        workbook.close()
+
+
+def write_csv(batches: Iterable[pd.DataFrame], path: str) -> int:
+    """Writes the batches to a csv file one after the other
+
+    Returns:
+        int: the number of rows written
+    """
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        for batch in batches:
+            batch.to_csv(file, header=rows == 0, index=False, quoting=csv.QUOTE_MINIMAL)
+            rows += len(batch)
+
+    return rows
+
+
+def _arrow_type(values: pd.Series) -> pa.DataType:
+    """Picks the Parquet type of a column from its first batch"""
+    if is_datetime64_any_dtype(values):
+        return pa.timestamp("us")
+    if values.dtype == bool:
+        return pa.bool_()
+    if is_numeric_dtype(values):
+        return pa.float64()
+
+    return pa.string()
+
+
+def schema_from_batch(batch: pd.DataFrame, types: TypeLookup = None) -> pa.Schema:
+    """Builds the schema of an output file from its first batch
+
+    Args:
+        batch (pd.DataFrame): the first batch of the file
+        types (TypeLookup): explicit types of some columns, as a dict or as a function of the
+            column name like emissions_schema.arrow_type, the other types come from the batch
+
+    Returns:
+        pa.Schema: the schema of the file
+    """
+    lookup = types if callable(types) else (types or {}).get
+    return pa.schema(
+        [(column, lookup(column) or _arrow_type(batch[column])) for column in batch.columns]
+    )
+
+
+def _coerce_batch(batch: pd.DataFrame, schema: pa.Schema) -> pd.DataFrame:
+    """Converts a batch to the types of the file, which were fixed by the first batch.
+    The values that do not fit a numeric or a date column, like "Division by zero!", become null
+    """
+    batch = batch.copy()
+    for field in schema:
+        values = batch[field.name]
+        if pa.types.is_string(field.type) or pa.types.is_dictionary(field.type):
+            batch[field.name] = values.where(values.isna(), values.astype(str))
+        elif pa.types.is_timestamp(field.type):
+            batch[field.name] = pd.to_datetime(values, errors="coerce", dayfirst=True)
+        elif pa.types.is_integer(field.type):
+            batch[field.name] = pd.to_numeric(values, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            batch[field.name] = pd.to_numeric(values, errors="coerce").astype(float)
+
+    return batch
+
+
+def _to_table(batch: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    return pa.Table.from_pandas(
+        _coerce_batch(batch[schema.names], schema), schema=schema, preserve_index=False
+    )
+
+
+def write_parquet(
+    batches: Iterable[pd.DataFrame],
+    path: str,
+    compression: str = "snappy",
+    types: TypeLookup = None,
+) -> int:
+    """Writes the batches to a Parquet file, one row group per batch
+
+    Args:
+        batches (Iterable[pd.DataFrame]): the batches, usually from iter_xlsx_batches
+        path (str): the Parquet file
+        compression (str): the Parquet compression codec
+        types (TypeLookup): explicit types of some columns, see schema_from_batch
+
+    Returns:
+        int: the number of rows written
+    """
+    rows = 0
+    writer = None
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = schema_from_batch(batch, types)
+                writer = pq.ParquetWriter(path, schema, compression=compression)
+
+            writer.write_table(_to_table(batch, schema))
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return rows
+
+
+def write_partitioned_parquet(
+    batches: Iterable[pd.DataFrame],
+    output_dir: str,
+    partition_column: str,
+    filename: str,
+    compression: str = "snappy",
+    types: TypeLookup = None,
+) -> Dict[str, int]:
+    """Writes the batches to one Parquet file per value of the partition column
+
+    The files follow the hive layout output_dir/<partition>=<value>/filename, where the name of
+    the partition is the column name in snake case, and the partition column is not stored in them.
+
+    Args:
+        batches (Iterable[pd.DataFrame]): the batches, usually from iter_xlsx_batches
+        output_dir (str): the root of the partitioned dataset
+        partition_column (str): the column the rows are partitioned by, like "Reporting Period"
+        filename (str): the name of the file written in every partition
+        compression (str): the Parquet compression codec
+        types (TypeLookup): explicit types of some columns, see schema_from_batch
+
+    Returns:
+        Dict[str, int]: the number of rows written to every file
+    """
+    partition_name = partition_column.lower().replace(" ", "_")
+    writers = {}
+    paths = {}
+    rows = {}
+    schema = None
+    try:
+        for batch in batches:
+            if schema is None:
+                schema = schema_from_batch(batch.drop(columns=partition_column), types)
+
+            for value, rows_of_value in batch.groupby(partition_column, sort=False):
+                if value not in writers:
+                    label = int(value) if isinstance(value, float) and value.is_integer() else value
+                    directory = os.path.join(output_dir, f"{partition_name}={label}")
+                    os.makedirs(directory, exist_ok=True)
+                    paths[value] = os.path.join(directory, filename)
+                    writers[value] = pq.ParquetWriter(paths[value], schema, compression=compression)
+                    rows[paths[value]] = 0
+
+                writers[value].write_table(_to_table(rows_of_value, schema))
+                rows[paths[value]] += len(rows_of_value)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return rows
+
+
+def write_feather(
+    batches: Iterable[pd.DataFrame],
+    path: str,
+    compression: Optional[str] = "lz4",
+    types: TypeLookup = None,
+) -> int:
+    """Writes the batches to a Feather (Arrow IPC) file, one record batch per batch
+
+    Args:
+        batches (Iterable[pd.DataFrame]): the batches, usually from iter_xlsx_batches
+        path (str): the Feather file
+        compression (Optional[str]): lz4, zstd or None
+        types (TypeLookup): explicit types of some columns, see schema_from_batch
+
+    Returns:
+        int: the number of rows written
+    """
+    rows = 0
+    writer = None
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = schema_from_batch(batch, types)
+                writer = pa.ipc.new_file(path, schema, options=options)
+
+            writer.write_table(_to_table(batch, schema))
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return rows
@@ -1,12 +1,15 @@
 import os
+import sys
 
 import awswrangler as wr
 import boto3
-import pandas as pd
 from dotenv import find_dotenv, load_dotenv
 
 import streamlit as st
 
+sys.path.append("src")
+from emissions_schema import apply_schema  # noqa: E402
+
 # find .env automagically by walking up directories until it's found
 dotenv_path = find_dotenv()
 load_dotenv(dotenv_path)
@@ -31,10 +34,11 @@ st.title("Ship emissions analysis")
 @st.cache_data
 def load_data():
     df = wr.athena.read_sql_query(f"SELECT * FROM {TABLE_NAME}", database=DATABASE_NAME)
-    df["doc_expiry_date"] = pd.to_datetime(df["doc_expiry_date"], dayfirst=True)
-    df["doc_issue_date"] = pd.to_datetime(df["doc_issue_date"], dayfirst=True)
 
-    return df
+    # the Glue job already split the technical efficiency into its type and value columns, the
+    # values it could not extract are empty strings that become missing here. Categoricals,
+    # float32 and small ints, the DoC dates are parsed day first
+    return apply_schema(df)
 
 
 df = load_data()
@@ -58,10 +62,6 @@ with col1:
 
 
 with col2:
-    df.loc[df["technical_efficiency_value"] == "", "technical_efficiency_value"] = "0"
-    df["technical_efficiency_value"] = df["technical_efficiency_value"].fillna("0")
-    df["technical_efficiency_value"] = df["technical_efficiency_value"].astype(float)
-
     efficiency_df = df.groupby("ship_type")["technical_efficiency_value"].mean().reset_index()
     st.write("Best and worst technical efficiency by ship type")
     st.bar_chart(data=efficiency_df, x="ship_type", y="technical_efficiency_value")
@@ -1,10 +1,19 @@
 import json
 import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
 
 sys.path.append("app")
+import api  # noqa: E402
 from api import app  # noqa: E402
 from fastapi.testclient import TestClient  # noqa: E402
 
+from api_decorators import render_json  # noqa: E402
+from data_store import EmissionsStore, to_split_dict  # noqa: E402
+
 client = TestClient(app)
 
 
@@ -116,3 +125,239 @@ def test_technical_efficiency_info_with_correct_ship_id():
         assert response["status-code"] == 200
         assert response["message"] == "OK"
         assert response["data"] == {"type": "EIV", "gCO₂/t·nm": "15.97"}
+
+
+def test_emissions_summary_with_incorrect_ship_type():
+    """Testing the response when user is requesting the emissions summary with an incorrect ship type label"""
+
+    with client as cl:
+        response = cl.get("/emissions/Passenger Ship/summary")
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "The argument provided is not correct"}
+
+
+def test_emissions_summary_with_the_correct_ship_type():
+    """Testing that the emissions summary has one record per reporting period with the aggregates"""
+
+    with client as cl:
+        response = json.loads(cl.get("/emissions/Oil tanker/summary").text)
+
+        assert response["status-code"] == 200
+        assert response["message"] == "OK"
+        assert len(response["data"]["summary"]) != 0
+        assert set(response["data"]["summary"][0]) == {
+            "Reporting Period",
+            "count",
+            "sum",
+            "mean",
+            "p25",
+            "p50",
+            "p75",
+            "p90",
+        }
+
+
+def test_fuel_consumption_summary_with_the_correct_ship_type():
+    """Testing that the fuel consumption summary has one record per reporting period"""
+
+    with client as cl:
+        response = json.loads(cl.get("/fuel_consumption/Oil tanker/summary").text)
+
+        assert response["status-code"] == 200
+        assert len(response["data"]["summary"]) != 0
+
+
+def test_emissions_pages_cover_all_the_rows():
+    """Testing that walking the pages of /emissions/{ship_type} returns the same rows as one request"""
+
+    with client as cl:
+        everything = json.loads(cl.get("/emissions/Oil tanker").text)["data"]
+
+        rows = []
+        params = {"limit": 7}
+        while True:
+            page = json.loads(cl.get("/emissions/Oil tanker", params=params).text)["data"]
+            assert len(page["data"]) <= 7
+            rows.extend(page["data"])
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+
+        assert rows == everything["data"]
+        assert everything["next_cursor"] is None
+
+
+def test_verifier_info_with_fields_projection():
+    """Testing that the fields parameter restricts the columns returned by /verifier_info"""
+
+    with client as cl:
+        response = json.loads(
+            cl.get(
+                "/verifier_info", params={"fields": "Verifier Name,Verifier Country", "limit": 5}
+            ).text
+        )
+
+        assert response["data"]["columns"] == ["Verifier Name", "Verifier Country"]
+        assert len(response["data"]["data"]) == 5
+
+
+def test_wrong_fields_and_cursor_are_caught():
+    """Testing that unknown fields and malformed cursors are rejected"""
+
+    with client as cl:
+        response = cl.get("/verifier_info", params={"fields": "Name"})
+        assert response.status_code == 400
+
+        response = cl.get("/verifier_info", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+
+
+def test_cursor_of_a_reloaded_dataset_is_gone(monkeypatch):
+    """Testing that a cursor given before a reload is refused instead of pointing to other rows"""
+
+    with client as cl:
+        page = json.loads(cl.get("/verifier_info", params={"limit": 10}).text)["data"]
+        monkeypatch.setattr(api, "store", EmissionsStore(api.store.df, version="reloaded"))
+
+        response = cl.get("/verifier_info", params={"limit": 10, "cursor": page["next_cursor"]})
+
+        assert response.status_code == 410
+
+
+def test_verifier_info_streams_ndjson():
+    """Testing that /verifier_info streams one JSON record per line when asked for ndjson"""
+
+    with client as cl:
+        everything = json.loads(cl.get("/verifier_info").text)["data"]
+        response = cl.get("/verifier_info", headers={"Accept": "application/x-ndjson"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert response.headers["x-status-code"] == "200"
+        assert response.text.endswith("\n")
+        lines = [json.loads(line) for line in response.text[:-1].split("\n")]
+        assert len(lines) == len(everything["data"])
+        assert list(lines[0]) == everything["columns"]
+
+
+def test_ndjson_dates_match_the_json_body():
+    """Testing that the DoC dates are streamed as ISO dates, like in the JSON body"""
+
+    with client as cl:
+        body = json.loads(cl.get("/ships/6602898").text)["data"]
+        response = cl.get("/ships/6602898", headers={"Accept": "application/x-ndjson"})
+
+        column = body["columns"].index("DoC issue date")
+        lines = [json.loads(line) for line in response.text[:-1].split("\n")]
+        assert [pd.Timestamp(line["DoC issue date"]) for line in lines] == [
+            pd.Timestamp(row[column]) for row in body["data"]
+        ]
+        assert isinstance(lines[0]["DoC issue date"], str)
+
+
+def test_emissions_streams_arrow():
+    """Testing that /emissions/{ship_type} streams an Arrow IPC stream when asked for it"""
+
+    with client as cl:
+        everything = json.loads(cl.get("/emissions/Oil tanker").text)["data"]
+        response = cl.get(
+            "/emissions/Oil tanker", headers={"Accept": "application/vnd.apache.arrow.stream"}
+        )
+
+        assert response.status_code == 200
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.column_names == everything["columns"]
+        assert table.num_rows == len(everything["data"])
+
+
+def test_conditional_get_returns_not_modified():
+    """Testing that a request with the ETag of a cached response gets a 304 without a body"""
+
+    with client as cl:
+        response = cl.get("/emissions/Oil tanker")
+        etag = response.headers["etag"]
+
+        assert response.status_code == 200
+        assert "max-age" in response.headers["cache-control"]
+
+        hits = json.loads(cl.get("/cache_stats").text)["data"]["hits"]
+        response = cl.get("/emissions/Oil tanker", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert json.loads(cl.get("/cache_stats").text)["data"]["hits"] == hits + 1
+
+
+def test_cached_response_gets_the_envelope_of_its_request():
+    """Testing that a cache hit has its own timestamp and url, only the data comes from the cache"""
+
+    with client as cl:
+        first = json.loads(cl.get("/ships").text)
+        hits = json.loads(cl.get("/cache_stats").text)["data"]["hits"]
+        time.sleep(0.01)
+        second = json.loads(cl.get("/ships", headers={"host": "api.example.com"}).text)
+
+        assert json.loads(cl.get("/cache_stats").text)["data"]["hits"] == hits + 1
+        assert second["data"] == first["data"]
+        assert second["timestamp"] > first["timestamp"]
+        assert second["url"] == "http://api.example.com/ships"
+
+
+def test_reload_requires_the_admin_token(monkeypatch):
+    """Testing that the reload endpoint is refused without the right admin token"""
+
+    with client as cl:
+        assert cl.post("/admin/reload").status_code == 403
+
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        response = cl.post("/admin/reload", headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == 403
+
+
+def test_reload_swaps_in_a_new_store(monkeypatch, tmp_path):
+    """Testing that a triggered reload replaces the store while the API keeps answering"""
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(api.reloader, "marker", str(tmp_path / "reload.marker"))
+    with client as cl:
+        old_store = api.store
+        response = cl.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 202
+
+        for _ in range(100):
+            if api.store is not old_store:
+                break
+            time.sleep(0.05)
+
+        assert api.store is not old_store
+        assert cl.get("/ships/6602898").status_code == 200
+
+
+def test_worker_started_with_a_stale_store_reloads_it(monkeypatch):
+    """Testing that a worker forked from a master holding an old version loads the current one"""
+    monkeypatch.setattr(api, "store", EmissionsStore(api.store.df, version="boot"))
+
+    with client as cl:
+        assert api.store.version == api.dataset_version(api._dataset_path())
+        assert cl.get("/ships").status_code == 200
+
+
+def test_float32_columns_are_rendered_without_widening():
+    """Testing that the store keeps the float32 measures and renders them with their short value"""
+    df = pd.DataFrame(
+        {
+            "IMO Number": np.array([1, 2], dtype=np.int32),
+            "Ship type": pd.Categorical(["Oil tanker", "Bulk carrier"]),
+            "Reporting Period": np.array([2021, 2021], dtype=np.int16),
+            "Total CO₂ emissions [m tonnes]": np.array([15.97, np.nan], dtype=np.float32),
+            "Total fuel consumption [m tonnes]": np.array([0.3, 2.0], dtype=np.float32),
+        }
+    )
+
+    store = EmissionsStore(df)
+
+    assert store.df["Total CO₂ emissions [m tonnes]"].dtype == np.float32
+    data = to_split_dict(store.rows(store.all_positions, ["Total CO₂ emissions [m tonnes]"]))
+    assert json.loads(render_json(data))["data"] == [[15.97], [None]]
@@ -0,0 +1,38 @@
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append("src")
+from reloader import DatasetReloader  # noqa: E402
+
+
+def _reloader(marker, loaded):
+    return DatasetReloader(
+        load=lambda: SimpleNamespace(version="v1"),
+        swap=loaded.append,
+        current_version=lambda: "v1",
+        interval=0,
+        marker=marker,
+        marker_interval=0.02,
+    )
+
+
+def test_trigger_reaches_every_reloader_of_the_marker(tmp_path):
+    """Testing that a reload asked to one worker is done by the others, even without polling"""
+    marker = str(tmp_path / "reload.marker")
+    loaded = [[], []]
+    reloaders = [_reloader(marker, stores) for stores in loaded]
+    for reloader in reloaders:
+        reloader.start(version="v1")
+
+    try:
+        reloaders[0].trigger()
+        for _ in range(100):
+            if all(loaded):
+                break
+            time.sleep(0.02)
+    finally:
+        for reloader in reloaders:
+            reloader.stop()
+
+    assert [len(stores) for stores in loaded] == [1, 1]
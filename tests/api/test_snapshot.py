@@ -0,0 +1,84 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append("src")
+from data_store import EmissionsStore  # noqa: E402
+from snapshot import csv_to_snapshot, load_snapshot  # noqa: E402
+
+
+def _interim_csv(path):
+    pd.DataFrame(
+        {
+            "IMO Number": [6602898, 6602898, 9000001],
+            "Ship type": ["Container ship", "Container ship", "Oil tanker"],
+            "Reporting Period": [2018, 2019, 2019],
+            "Technical efficiency": ["Not Applicable", "EIV (19.03 gCO₂/t·nm)", None],
+            "Total CO₂ emissions [m tonnes]": ["1153.19", "48049.53", "Division by zero!"],
+            "Total fuel consumption [m tonnes]": [167.52, 18286.23, 12.5],
+        }
+    ).to_csv(path, index=False)
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Testing that the snapshot is read back with the values and types that were written"""
+    csv_path = tmp_path / "interim.csv"
+    snapshot_path = tmp_path / "interim.arrow"
+    _interim_csv(csv_path)
+
+    table = csv_to_snapshot(str(csv_path), str(snapshot_path))
+    df = load_snapshot(str(snapshot_path))
+
+    assert df.equals(table.to_pandas())
+    assert df["IMO Number"].dtype == "int32"
+    assert df["Reporting Period"].dtype == "int16"
+    assert df["Ship type"].dtype == "category"
+    assert df["Total CO₂ emissions [m tonnes]"].dtype == "float32"
+    assert df["Total CO₂ emissions [m tonnes]"].isna().tolist() == [False, False, True]
+    assert df["technical_efficiency_type"].tolist()[1] == "EIV"
+    assert df["technical_efficiency_value"].tolist()[1] == pytest.approx(19.03)
+
+
+def test_snapshot_columns_are_projected(tmp_path):
+    csv_path = tmp_path / "interim.csv"
+    snapshot_path = tmp_path / "interim.arrow"
+    _interim_csv(csv_path)
+    csv_to_snapshot(str(csv_path), str(snapshot_path))
+
+    df = load_snapshot(str(snapshot_path), columns=["IMO Number", "Reporting Period"])
+
+    assert df.columns.tolist() == ["IMO Number", "Reporting Period"]
+    assert df["Reporting Period"].tolist() == [2018, 2019, 2019]
+
+
+def test_rebuild_does_not_touch_the_mapped_snapshot(tmp_path):
+    """Testing that a rebuild replaces the file, the frame of a running worker keeps its data"""
+    csv_path = tmp_path / "interim.csv"
+    snapshot_path = tmp_path / "interim.arrow"
+    _interim_csv(csv_path)
+    csv_to_snapshot(str(csv_path), str(snapshot_path))
+    served = load_snapshot(str(snapshot_path))
+    inode = os.stat(snapshot_path).st_ino
+
+    pd.read_csv(csv_path).assign(**{"IMO Number": 1}).to_csv(csv_path, index=False)
+    csv_to_snapshot(str(csv_path), str(snapshot_path))
+
+    assert os.stat(snapshot_path).st_ino != inode
+    assert served["IMO Number"].tolist() == [6602898, 6602898, 9000001]
+    assert load_snapshot(str(snapshot_path))["IMO Number"].tolist() == [1, 1, 1]
+
+
+def test_store_shares_the_mapped_columns(tmp_path):
+    """Testing that building the store does not copy the numeric columns of the snapshot"""
+    csv_path = tmp_path / "interim.csv"
+    snapshot_path = tmp_path / "interim.arrow"
+    _interim_csv(csv_path)
+    csv_to_snapshot(str(csv_path), str(snapshot_path))
+    df = load_snapshot(str(snapshot_path))
+
+    store = EmissionsStore(df)
+
+    assert np.shares_memory(store.df["IMO Number"].to_numpy(), df["IMO Number"].to_numpy())
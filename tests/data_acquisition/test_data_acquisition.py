@@ -0,0 +1,193 @@
+import sys
+import threading
+import time
+
+import boto3
+import pandas as pd
+from moto import mock_s3
+
+sys.path.append("src")
+import data_acquisition  # noqa: E402
+from ingestion_manifest import IngestionManifest  # noqa: E402
+
+
+class _Link:
+    def __init__(self, path):
+        self.path = path
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        self.path.write_bytes(b"report")
+
+
+class _Grid:
+    def find_elements(self, by, value):
+        return [object()]
+
+
+class _Driver:
+    """Stands in for the remote Chrome session, clicking a link writes the report to disk"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.sessions = 0
+
+    def get(self, url):
+        self.sessions += 1
+
+    def find_element(self, by, value):
+        if value == data_acquisition.REPORTS_TABLE_XPATH:
+            return _Grid()
+        return _Link(self.directory / f"{value}.xlsx")
+
+    def quit(self):
+        pass
+
+
+def _metadata(versions):
+    return pd.DataFrame(
+        {
+            "Reporting Period": [2018, 2019, 2020],
+            "Version": versions,
+            "Generation Date": ["01/01/2023"] * 3,
+            "File": [f"{year}-v{version}" for year, version in zip([2018, 2019, 2020], versions)],
+        }
+    )
+
+
+@mock_s3
+def test_all_new_versions_are_uploaded_with_one_session(tmp_path, monkeypatch):
+    """Testing that every new version is downloaded in one browser session and uploaded"""
+    driver = _Driver(tmp_path)
+    monkeypatch.setattr(data_acquisition, "prepare_selenium_params", lambda: driver)
+    monkeypatch.setattr(data_acquisition, "DOWNLOAD_DIRECTORY", str(tmp_path))
+
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=data_acquisition.BUCKET)
+
+    updated = data_acquisition.compare_versions_and_download_file(
+        current_df=_metadata([1, 1, 1]), new_df=_metadata([2, 1, 3])
+    )
+
+    assert driver.sessions == 1
+    assert updated["Version"].tolist() == [2, 1, 3]
+    keys = [obj["Key"] for obj in s3.list_objects_v2(Bucket=data_acquisition.BUCKET)["Contents"]]
+    assert sorted(keys) == ["raw/2018/2018-v2.xlsx", "raw/2020/2020-v3.xlsx"]
+    assert list(tmp_path.iterdir()) == []
+
+
+@mock_s3
+def test_identical_content_is_not_uploaded_again(tmp_path, monkeypatch):
+    """Testing that a new version with the bytes of an ingested file skips the upload"""
+    driver = _Driver(tmp_path)
+    monkeypatch.setattr(data_acquisition, "prepare_selenium_params", lambda: driver)
+    monkeypatch.setattr(data_acquisition, "DOWNLOAD_DIRECTORY", str(tmp_path))
+
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=data_acquisition.BUCKET)
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+
+    data_acquisition.compare_versions_and_download_file(
+        current_df=_metadata([1, 1, 1]), new_df=_metadata([2, 1, 1]), manifest=manifest
+    )
+    # the 2020 report is republished with the same bytes as the 2018 one
+    data_acquisition.compare_versions_and_download_file(
+        current_df=_metadata([2, 1, 1]), new_df=_metadata([2, 1, 2]), manifest=manifest
+    )
+
+    keys = [obj["Key"] for obj in s3.list_objects_v2(Bucket=data_acquisition.BUCKET)["Contents"]]
+    assert keys == ["raw/2018/2018-v2.xlsx"]
+    assert len(manifest.files) == 1
+    entry = next(iter(manifest.files.values()))
+    assert entry["etag"] == s3.head_object(Bucket=data_acquisition.BUCKET, Key=keys[0])["ETag"]
+    assert entry["size"] == len(b"report")
+
+
+@mock_s3
+def test_failed_upload_does_not_abort_the_run(tmp_path, monkeypatch):
+    """Testing that a report that cannot be uploaded is left out and the others still are"""
+    driver = _Driver(tmp_path)
+    monkeypatch.setattr(data_acquisition, "prepare_selenium_params", lambda: driver)
+    monkeypatch.setattr(data_acquisition, "DOWNLOAD_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(data_acquisition, "BUCKET", "missing-bucket")
+    monkeypatch.setattr(data_acquisition.s3_transfer.time, "sleep", lambda seconds: None)
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+
+    updated = data_acquisition.compare_versions_and_download_file(
+        current_df=_metadata([1, 1, 1]), new_df=_metadata([2, 1, 3]), manifest=manifest
+    )
+
+    assert updated["Version"].tolist() == [1, 1, 1]
+    assert manifest.files == {}
+
+
+def test_download_is_complete_once_the_partial_file_is_renamed(tmp_path):
+    """Testing that the watcher follows the .crdownload file until the browser renames it"""
+    filepath = tmp_path / "2021-v1.xlsx"
+    partial = tmp_path / "2021-v1.xlsx.crdownload"
+    partial.write_bytes(b"x")
+
+    def download():
+        for _ in range(5):
+            time.sleep(0.1)
+            with open(partial, "ab") as file:
+                file.write(b"x" * 100)
+        partial.rename(filepath)
+
+    thread = threading.Thread(target=download)
+    thread.start()
+    complete = data_acquisition.wait_for_download(
+        str(filepath), stall_timeout=2, settle_time=0.2, poll_interval=0.05
+    )
+    thread.join()
+
+    assert complete
+    assert filepath.stat().st_size == 501
+
+
+def test_stalled_download_gives_up(tmp_path):
+    """Testing that a partial file that stops growing fails after the stall timeout"""
+    filepath = tmp_path / "2021-v1.xlsx"
+    (tmp_path / "2021-v1.xlsx.crdownload").write_bytes(b"x")
+
+    start = time.monotonic()
+    complete = data_acquisition.wait_for_download(
+        str(filepath), stall_timeout=0.3, poll_interval=0.05
+    )
+
+    assert not complete
+    assert time.monotonic() - start < 2
+
+
+@mock_s3
+def test_periods_missing_from_the_manifest_keep_their_csv_versions(tmp_path, monkeypatch):
+    """Testing that main compares the site against the csv for the periods the manifest lacks"""
+    monkeypatch.chdir(tmp_path)
+    _metadata([1, 1, 1]).to_csv("reports_metadata.csv", index=False)
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    manifest.record("abc", 6, 2018, 2, "2023-01-01", "2018-v2")
+    manifest.save()
+
+    fetched = []
+
+    def fetch_reports(rows, manifest):
+        fetched.extend(row["Reporting Period"] for row in rows)
+        return rows
+
+    monkeypatch.setattr(data_acquisition, "get_reports_metadata", lambda: _metadata([2, 5, 7]))
+    monkeypatch.setattr(data_acquisition, "fetch_reports", fetch_reports)
+    monkeypatch.setattr(
+        data_acquisition,
+        "IngestionManifest",
+        lambda s3_client: IngestionManifest(str(tmp_path / "manifest.json")),
+    )
+
+    data_acquisition.main()
+
+    assert fetched == [2019, 2020]
+    assert pd.read_csv("reports_metadata.csv")["Version"].tolist() == [2, 5, 7]
@@ -0,0 +1,104 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pandas as pd
+import pytest
+from moto import mock_s3
+
+sys.path.append("src")
+import data_acquisition  # noqa: E402
+from mrv_http_client import MRVHttpClient  # noqa: E402
+
+REPORTS = [
+    {"reportingPeriod": 2020, "version": 4, "generationDate": "03/02/2023", "fileName": "2020-v4"},
+    {"reportingPeriod": 2021, "version": 2, "generationDate": "15/06/2023", "fileName": "2021-v2"},
+]
+CONTENT = b"PK" + bytes(range(256)) * 10000
+
+
+class _MRVHandler(BaseHTTPRequestHandler):
+    """Stands in for the endpoints behind the grid of the Thetis MRV page"""
+
+    def do_GET(self):
+        if self.path == "/reports":
+            body = json.dumps({"data": REPORTS}).encode()
+        elif self.path in ("/reports/2020-v4", "/reports/2021-v2"):
+            body = CONTENT
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mrv_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MRVHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_metadata_is_parsed_like_the_scraped_table(mrv_url):
+    """Testing that the records of the endpoint give the same columns as the Selenium backend"""
+    df = data_acquisition.get_reporting_table_content_http(MRVHttpClient(base_url=mrv_url))
+
+    expected = pd.DataFrame(
+        {
+            "Reporting Period": [2020, 2021],
+            "Version": [4, 2],
+            "Generation Date": ["03/02/2023", "15/06/2023"],
+            "File": ["2020-v4", "2021-v2"],
+        }
+    )
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_report_is_streamed_to_disk(mrv_url, tmp_path):
+    """Testing that the file is written under its final name only once it is complete"""
+    filepath = MRVHttpClient(base_url=mrv_url).download("2021-v2", str(tmp_path))
+
+    assert filepath == str(tmp_path / "2021-v2.xlsx")
+    assert (tmp_path / "2021-v2.xlsx").read_bytes() == CONTENT
+    assert [path.name for path in tmp_path.iterdir()] == ["2021-v2.xlsx"]
+
+
+@mock_s3
+def test_new_versions_are_fetched_without_the_browser(mrv_url, tmp_path, monkeypatch):
+    """Testing that the HTTP backend uploads the reports and Selenium is not started"""
+    monkeypatch.setenv("MRV_API_URL", mrv_url)
+    monkeypatch.setattr(data_acquisition, "DOWNLOAD_DIRECTORY", str(tmp_path))
+
+    def no_browser():
+        raise AssertionError("Selenium should not be used")
+
+    monkeypatch.setattr(data_acquisition, "prepare_selenium_params", no_browser)
+
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=data_acquisition.BUCKET)
+
+    current = pd.DataFrame(
+        {
+            "Reporting Period": [2020, 2021],
+            "Version": [3, 2],
+            "Generation Date": ["01/01/2023", "15/06/2023"],
+            "File": ["2020-v3", "2021-v2"],
+        }
+    )
+    new = data_acquisition.get_reports_metadata()
+    updated = data_acquisition.compare_versions_and_download_file(current_df=current, new_df=new)
+
+    assert updated["Version"].tolist() == [4, 2]
+    body = s3.get_object(Bucket=data_acquisition.BUCKET, Key="raw/2020/2020-v4.xlsx")["Body"]
+    assert body.read() == CONTENT
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,116 @@
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from moto import mock_s3
+
+sys.path.append("src")
+import s3_transfer  # noqa: E402
+
+BUCKET = "eu-marv-ship-emissions"
+MB = 1024 * 1024
+# the parts of a multipart upload are at least 5 MB, except the last one
+CONFIG = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=2)
+
+
+class _Stream:
+    """A file object that can only be read, like the body of an HTTP response"""
+
+    def __init__(self, content):
+        self._buffer = io.BytesIO(content)
+
+    def read(self, amount=-1):
+        return self._buffer.read(amount)
+
+
+@pytest.fixture
+def s3():
+    with mock_s3():
+        client = s3_transfer.create_s3_client(config=CONFIG)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.mark.parametrize("size", [MB, 12 * MB])
+def test_file_is_uploaded_with_its_checksum(s3, tmp_path, size):
+    """Testing that single and multipart uploads are verified and carry their SHA-256"""
+    content = os.urandom(size)
+    path = tmp_path / "2021-v2.xlsx"
+    path.write_bytes(content)
+
+    stored = s3_transfer.upload_file(str(path), BUCKET, "raw/2021/2021-v2.xlsx", s3, CONFIG)
+
+    head = s3.head_object(Bucket=BUCKET, Key="raw/2021/2021-v2.xlsx")
+    assert stored["etag"] == head["ETag"]
+    assert stored["size"] == size
+    assert head["Metadata"]["sha256"] == hashlib.sha256(content).hexdigest()
+    assert head["ETag"].endswith('-3"') == (size > CONFIG.multipart_threshold)
+
+
+def test_stream_is_uploaded_without_a_local_copy(s3):
+    """Testing that a stream that cannot be rewound is uploaded in parts and verified"""
+    content = os.urandom(11 * MB)
+
+    stored = s3_transfer.upload_fileobj(
+        _Stream(content), BUCKET, "raw/2020/2020-v4.xlsx", s3, CONFIG
+    )
+
+    body = s3.get_object(Bucket=BUCKET, Key="raw/2020/2020-v4.xlsx")["Body"].read()
+    assert body == content
+    assert stored["sha256"] == hashlib.sha256(content).hexdigest()
+    assert stored["etag"].endswith('-3"')
+
+
+def test_failed_upload_is_retried(s3, tmp_path, monkeypatch):
+    """Testing that a failed attempt is retried after a backoff"""
+    path = tmp_path / "2021-v2.xlsx"
+    path.write_bytes(b"report")
+    upload = s3.upload_file
+    calls = []
+
+    def flaky_upload(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise ClientError({"Error": {"Code": "SlowDown"}}, "PutObject")
+        return upload(*args, **kwargs)
+
+    monkeypatch.setattr(s3, "upload_file", flaky_upload)
+    monkeypatch.setattr(s3_transfer.time, "sleep", lambda seconds: None)
+
+    stored = s3_transfer.upload_file(str(path), BUCKET, "raw/2021/2021-v2.xlsx", s3, CONFIG)
+
+    assert len(calls) == 2
+    assert stored["size"] == len(b"report")
+
+
+def test_corrupted_object_is_detected(s3, tmp_path, monkeypatch):
+    """Testing that an object that differs from what was sent fails the verification"""
+    path = tmp_path / "2021-v2.xlsx"
+    path.write_bytes(b"report")
+
+    def truncated_upload(filename, bucket, key, **kwargs):
+        s3.put_object(Bucket=bucket, Key=key, Body=b"repo")
+
+    monkeypatch.setattr(s3, "upload_file", truncated_upload)
+    monkeypatch.setattr(s3_transfer.time, "sleep", lambda seconds: None)
+
+    with pytest.raises(s3_transfer.ChecksumMismatch):
+        s3_transfer.upload_file(str(path), BUCKET, "raw/2021/2021-v2.xlsx", s3, CONFIG, attempts=2)
+
+
+def test_upload_failed_error_is_retried(s3, tmp_path, monkeypatch):
+    """Testing that the S3UploadFailedError boto3 raises for a failed transfer is retried"""
+    path = tmp_path / "2021-v2.xlsx"
+    path.write_bytes(b"report")
+    sleeps = []
+    monkeypatch.setattr(s3_transfer.time, "sleep", sleeps.append)
+
+    with pytest.raises(S3UploadFailedError):
+        s3_transfer.upload_file(str(path), "missing-bucket", "raw/2021/2021-v2.xlsx", s3, CONFIG)
+
+    assert len(sleeps) == s3_transfer.UPLOAD_ATTEMPTS - 1
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.fixture
+def write_workbook():
+    """Writes a frame like the EU-MRV workbooks do, with the header on the third row
+
+    Returns:
+        Callable: takes the path and the frame and returns the path of the workbook as a str
+    """
+
+    def write(path, df):
+        df.to_excel(path, startrow=2, index=False)
+        return str(path)
+
+    return write
@@ -0,0 +1,81 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("src")
+from emissions_schema import (  # noqa: E402
+    apply_schema,
+    memory_footprint,
+    prepare_report,
+)
+
+
+def test_columns_get_the_canonical_types():
+    """Testing the types of the workbook and of the snake case (Athena) column names"""
+    df = pd.DataFrame(
+        {
+            "IMO Number": [9152820, 6602898],
+            "Reporting Period": [2018, 2019],
+            "Ship type": ["Oil tanker", "Oil tanker"],
+            "Total CO₂ emissions [m tonnes]": [15.97, "Division by zero!"],
+            "DoC issue date": ["31/05/2019", "DoC not issued"],
+            "total_fuel_consumption_m_tonnes_": [1.5, 2.5],
+            "verifier_country": ["Germany", "Germany"],
+        }
+    )
+
+    converted = apply_schema(df)
+
+    assert converted["IMO Number"].dtype == np.int32
+    assert converted["Reporting Period"].dtype == np.int16
+    assert converted["Ship type"].dtype == "category"
+    assert converted["verifier_country"].dtype == "category"
+    assert converted["Total CO₂ emissions [m tonnes]"].dtype == np.float32
+    assert converted["total_fuel_consumption_m_tonnes_"].dtype == np.float32
+    assert pd.isna(converted["Total CO₂ emissions [m tonnes]"].iloc[1])
+    assert converted["DoC issue date"].iloc[0] == pd.Timestamp(2019, 5, 31)
+    assert pd.isna(converted["DoC issue date"].iloc[1])
+    assert memory_footprint(converted) < memory_footprint(df)
+
+
+def test_dates_survive_a_csv_round_trip(tmp_path):
+    """Testing that the ISO dates of the interim csv are read back as they were written, even when
+    the day of the first one could be a month
+    """
+    df = pd.DataFrame(
+        {
+            "IMO Number": [9152820, 6602898, 9000001],
+            "DoC issue date": ["05/12/2019", "31/05/2020", "DoC not issued"],
+        }
+    )
+    converted = apply_schema(df)
+    path = tmp_path / "interim.csv"
+    converted.to_csv(path, index=False)
+
+    read_back = apply_schema(pd.read_csv(path))
+
+    assert converted["DoC issue date"].iloc[0] == pd.Timestamp(2019, 12, 5)
+    assert read_back["DoC issue date"].equals(converted["DoC issue date"])
+
+
+def test_report_keeps_the_last_row_of_a_ship_and_period():
+    """Testing that a ship listed twice in a period keeps its last row, with the partition type"""
+    df = pd.DataFrame(
+        {
+            "IMO Number": [9152820, 6602898, 9152820, 9152820],
+            "Reporting Period": [2021, 2021, 2021, 2020],
+            "Total CO₂ emissions [m tonnes]": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+    report = prepare_report(df)
+
+    assert report["Reporting Period"].dtype == np.int16
+    assert report.index.equals(pd.RangeIndex(3))
+    assert report[["IMO Number", "Reporting Period"]].values.tolist() == [
+        [6602898, 2021],
+        [9152820, 2021],
+        [9152820, 2020],
+    ]
+    assert report["Total CO₂ emissions [m tonnes]"].tolist() == [2.0, 3.0, 4.0]
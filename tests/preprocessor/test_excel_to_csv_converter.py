@@ -0,0 +1,73 @@
+import os
+import sys
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.append("src")
+from excel_to_csv_converter import convert_file  # noqa: E402
+
+
+def _report(periods):
+    return pd.DataFrame(
+        {
+            "IMO Number": range(len(periods)),
+            "Reporting Period": periods,
+            "Ship type": "Oil tanker",
+            "Total CO₂ emissions [m tonnes]": 1.5,
+        }
+    )
+
+
+def _partitions(output_dir):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), output_dir)
+        for root, _, names in os.walk(output_dir)
+        for name in names
+    )
+
+
+def test_parquet_is_partitioned_by_reporting_period(tmp_path, write_workbook):
+    """Testing the hive layout of the output, without the partition column in the files"""
+    workbook = write_workbook(tmp_path / "2020-v3.xlsx", _report([2020, 2021, 2021]))
+    output_dir = str(tmp_path / "processed")
+
+    stats = convert_file(workbook, output_dir)
+
+    assert stats["rows"] == 3
+    assert _partitions(output_dir) == [
+        "reporting_period=2020/2020-v3.parquet",
+        "reporting_period=2021/2020-v3.parquet",
+    ]
+    table = pq.read_table(os.path.join(output_dir, "reporting_period=2021", "2020-v3.parquet"))
+    assert table.num_rows == 2
+    assert "Reporting Period" not in table.column_names
+
+
+def test_up_to_date_workbook_is_skipped(tmp_path, write_workbook):
+    """Testing that a workbook is converted again only when it changed or when forced"""
+    workbook = write_workbook(tmp_path / "2020-v3.xlsx", _report([2020]))
+    output_dir = str(tmp_path / "processed")
+    convert_file(workbook, output_dir)
+
+    assert convert_file(workbook, output_dir)["skipped"]
+    assert not convert_file(workbook, output_dir, force=True)["skipped"]
+
+    later = os.path.getmtime(workbook) + 60
+    os.utime(workbook, (later, later))
+    assert not convert_file(workbook, output_dir)["skipped"]
+
+
+def test_stale_partitions_are_removed(tmp_path, write_workbook):
+    """Testing that a period missing from the new version of a workbook loses its file"""
+    workbook = write_workbook(tmp_path / "2020-v3.xlsx", _report([2020, 2021]))
+    output_dir = str(tmp_path / "processed")
+    convert_file(workbook, output_dir)
+
+    write_workbook(workbook, _report([2021, 2021]))
+    later = os.path.getmtime(workbook) + 60
+    os.utime(workbook, (later, later))
+    stats = convert_file(workbook, output_dir)
+
+    assert stats["rows"] == 2
+    assert _partitions(output_dir) == ["reporting_period=2021/2020-v3.parquet"]
@@ -0,0 +1,73 @@
+import sys
+
+import pandas as pd
+
+sys.path.append("src")
+from ingestion_manifest import IngestionManifest  # noqa: E402
+from preprocessor import (  # noqa: E402
+    merge_period_outputs,
+    update_period_outputs,
+)
+from projection_plan import infer_projection_plan  # noqa: E402
+
+
+def _report(period, emissions):
+    return pd.DataFrame(
+        {
+            "IMO Number": [1, 2],
+            "Reporting Period": period,
+            "Ship type": "Oil tanker",
+            "Technical efficiency": "EIV (15.97 gCO₂/t·nm)",
+            "Total CO₂ emissions [m tonnes]": emissions,
+        }
+    )
+
+
+def test_only_the_changed_periods_are_recomputed(tmp_path, write_workbook):
+    """Testing that the manifest keeps the unchanged workbooks from being processed again"""
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    files = [
+        write_workbook(raw / "2020.xlsx", _report(2020, [1.0, 2.0])),
+        write_workbook(raw / "2021.xlsx", _report(2021, [3.0, 4.0])),
+    ]
+    plan = infer_projection_plan(files, max_workers=1)
+    output_dir = str(tmp_path / "periods")
+    manifest_path = str(tmp_path / "manifest.json")
+
+    manifest = IngestionManifest(manifest_path).load()
+    assert update_period_outputs(files, manifest, output_dir, plan) == [2020, 2021]
+    manifest.save()
+
+    write_workbook(raw / "2021.xlsx", _report(2021, [5.0, 6.0]))
+    manifest = IngestionManifest(manifest_path).load()
+    assert update_period_outputs(files, manifest, output_dir, plan) == [2021]
+    assert update_period_outputs(files, manifest, output_dir, plan) == []
+
+    df = merge_period_outputs(output_dir)
+    assert df["Total CO₂ emissions [m tonnes]"].tolist() == [1.0, 2.0, 5.0, 6.0]
+    assert df["technical_efficiency_type"].tolist() == ["EIV"] * 4
+
+
+def test_changed_workbooks_are_parsed_together_with_aligned_schemas(tmp_path, write_workbook):
+    """Testing that a column numeric in one year and text in another becomes text in both"""
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    files = [
+        write_workbook(raw / "2020.xlsx", _report(2020, [1.0, 2.0])),
+        write_workbook(raw / "2021.xlsx", _report(2021, [3.0, 4.0])),
+    ]
+    for file, accreditation in zip(files, [[2, 3], ["0002", "A-3"]]):
+        df = pd.read_excel(file, header=2).assign(
+            **{"Verifier Accreditation number": accreditation}
+        )
+        write_workbook(file, df)
+    plan = infer_projection_plan(files, max_workers=1)
+    output_dir = str(tmp_path / "periods")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+
+    changed = update_period_outputs(files, manifest, output_dir, plan, max_workers=2)
+
+    assert changed == [2020, 2021]
+    df = merge_period_outputs(output_dir)
+    assert df["Verifier Accreditation number"].tolist() == ["2", "3", "0002", "A-3"]
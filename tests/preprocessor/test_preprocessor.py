@@ -0,0 +1,64 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("src")
+from preprocessor import (  # noqa: E402
+    process_technical_efficiency_values,
+    read_datasets_and_merge,
+)
+
+
+def test_technical_efficiency_is_split_into_type_and_value():
+    """Testing that the EIV and EEDI strings are parsed like the Glue job does"""
+    df = pd.DataFrame(
+        {
+            "Technical efficiency": [
+                "EIV (15.97 gCO₂/t·nm)",
+                "EEDI (4.5 gCO₂/t·nm)",
+                "Not Applicable",
+                None,
+            ]
+        }
+    )
+
+    df = process_technical_efficiency_values(df)
+
+    assert df["technical_efficiency_type"].tolist()[:2] == ["EIV", "EEDI"]
+    assert df["technical_efficiency_type"].iloc[2:].isna().all()
+    np.testing.assert_array_equal(
+        df["technical_efficiency_value"].to_numpy(), [15.97, 4.5, np.nan, np.nan]
+    )
+    assert df["technical_efficiency_value"].dtype == float
+
+
+def test_workbooks_are_merged_and_cached(tmp_path, write_workbook):
+    """Testing that the years are merged with reconciled columns and that the cache is reused"""
+    files = [
+        write_workbook(
+            tmp_path / "2018.xlsx",
+            pd.DataFrame({"IMO Number": [1, 2], "Reporting Period": 2018, "Total": [1.5, 2.5]}),
+        ),
+        write_workbook(
+            tmp_path / "2019.xlsx",
+            pd.DataFrame(
+                {
+                    "IMO Number": [3],
+                    "Reporting Period": 2019,
+                    "Total": ["Division by zero!"],
+                    "New": 1,
+                }
+            ),
+        ),
+    ]
+    cache_dir = tmp_path / "cache"
+
+    df = read_datasets_and_merge(files, cache_dir=str(cache_dir))
+
+    assert list(df.columns) == ["IMO Number", "Reporting Period", "Total", "New"]
+    assert df["Total"].tolist() == ["1.5", "2.5", "Division by zero!"]
+    assert len(list(cache_dir.glob("*.parquet"))) == 2
+
+    cached = read_datasets_and_merge(files, cache_dir=str(cache_dir))
+    pd.testing.assert_frame_equal(df, cached)
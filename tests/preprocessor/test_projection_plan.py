@@ -0,0 +1,43 @@
+import sys
+
+import pandas as pd
+
+sys.path.append("src")
+from preprocessor import (  # noqa: E402
+    read_datasets_and_merge,
+    remove_null_columns,
+)
+from projection_plan import (  # noqa: E402
+    infer_projection_plan,
+    load_plan,
+    save_plan,
+)
+
+
+def test_plan_keeps_the_columns_filled_in_every_file(tmp_path, write_workbook):
+    """Testing that the plan keeps the columns remove_null_columns would keep and that only they
+    are read from the workbooks
+    """
+    files = [
+        write_workbook(
+            tmp_path / "2018.xlsx",
+            pd.DataFrame({"IMO Number": [1, 2], "Ship type": "Oil tanker", "Notes": [None, "x"]}),
+        ),
+        write_workbook(
+            tmp_path / "2019.xlsx",
+            pd.DataFrame({"IMO Number": [3], "Ship type": "Bulk carrier", "Extra": [1.5]}),
+        ),
+    ]
+
+    plan = infer_projection_plan(files, max_workers=1)
+
+    assert plan["columns"] == ["IMO Number", "Ship type"]
+    assert plan["types"] == {"IMO Number": ["number"], "Ship type": ["text"]}
+
+    df = read_datasets_and_merge(files, max_workers=1, columns=plan["columns"])
+    full = read_datasets_and_merge(files, max_workers=1)
+    assert list(df.columns) == ["IMO Number", "Ship type"]
+    pd.testing.assert_frame_equal(remove_null_columns(df, plan=plan), remove_null_columns(full))
+
+    save_plan(plan, str(tmp_path / "plan.json"))
+    assert infer_projection_plan(files, previous=load_plan(str(tmp_path / "plan.json"))) == plan
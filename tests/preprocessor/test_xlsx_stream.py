@@ -0,0 +1,50 @@
+import sys
+
+import pandas as pd
+
+sys.path.append("src")
+from xlsx_stream import (  # noqa: E402
+    iter_xlsx_batches,
+    write_csv,
+    write_parquet,
+)
+
+
+def _report():
+    return pd.DataFrame(
+        {
+            "IMO Number": range(25),
+            "Total CO₂ emissions [m tonnes]": [float(i) for i in range(24)] + ["Division by zero!"],
+            "Ship type": "Oil tanker",
+        }
+    )
+
+
+def test_batches_follow_the_header_offset(tmp_path, write_workbook):
+    """Testing that the rows are read in batches of the requested size below the header"""
+    df = _report()
+    path = write_workbook(tmp_path / "2019.xlsx", df)
+
+    batches = list(iter_xlsx_batches(path, header=2, batch_size=10))
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert list(batches[0].columns) == list(df.columns)
+    assert pd.concat(batches, ignore_index=True)["IMO Number"].tolist() == list(range(25))
+
+
+def test_batches_are_written_to_csv_and_parquet(tmp_path, write_workbook):
+    """Testing that the batches are written incrementally with the types of the first batch"""
+    path = write_workbook(tmp_path / "2019.xlsx", _report())
+
+    rows = write_csv(iter_xlsx_batches(path, batch_size=10), str(tmp_path / "out.csv"))
+    assert rows == 25
+    assert len(pd.read_csv(tmp_path / "out.csv")) == 25
+
+    columns = ["IMO Number", "Total CO₂ emissions [m tonnes]"]
+    batches = iter_xlsx_batches(path, batch_size=10, columns=columns)
+    write_parquet(batches, str(tmp_path / "out.parquet"))
+
+    written = pd.read_parquet(tmp_path / "out.parquet")
+    assert list(written.columns) == columns
+    assert written["Total CO₂ emissions [m tonnes]"].iloc[:24].tolist() == list(range(24))
+    assert pd.isna(written["Total CO₂ emissions [m tonnes]"].iloc[24])
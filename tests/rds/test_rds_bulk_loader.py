@@ -0,0 +1,122 @@
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append("src")
+import rds_bulk_loader  # noqa: E402
+from rds_bulk_loader import (  # noqa: E402
+    ensure_emissions_table,
+    has_unique_key,
+    load_frames,
+    read_csv_chunks,
+    table_summary,
+)
+
+CREATE_TABLE = (
+    "CREATE TABLE emissions (IMONumber INTEGER, ShipType TEXT, TotalCO₂Emissions REAL, "
+    "ReportingPeriod INTEGER, TotalFuelConsumption REAL)"
+)
+
+
+def _chunks(rows, chunksize):
+    df = pd.DataFrame(
+        {
+            "IMO Number": np.arange(rows),
+            "Name": "ship",
+            "Ship type": "Bulk carrier",
+            "Total CO₂ emissions [m tonnes]": np.arange(rows) * 1.5,
+            "Reporting Period": 2021,
+            "Total fuel consumption [m tonnes]": [np.nan] + [2.0] * (rows - 1),
+        }
+    )
+    return [df.iloc[start:][:chunksize] for start in range(0, rows, chunksize)]
+
+
+def test_every_row_is_loaded_in_batches():
+    """Testing that all the rows of all the chunks are inserted, not only the first ones"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(CREATE_TABLE)
+
+    stats = load_frames(conn, _chunks(2500, 1000), batch_size=400)
+
+    assert stats["rows"] == 2500
+    assert stats["batches"] == 8
+    assert conn.execute("SELECT COUNT(*), SUM(TotalCO₂Emissions) FROM emissions").fetchone() == (
+        2500,
+        sum(range(2500)) * 1.5,
+    )
+    assert conn.execute(
+        "SELECT TotalFuelConsumption FROM emissions WHERE IMONumber = 0"
+    ).fetchone() == (None,)
+
+
+def test_a_failed_batch_is_rolled_back():
+    """Testing that a batch is one transaction, the batches before it stay committed"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(CREATE_TABLE.replace("ShipType TEXT", "ShipType TEXT NOT NULL"))
+    chunks = _chunks(10, 10)
+    chunks[0].loc[7, "Ship type"] = None
+
+    with pytest.raises(sqlite3.IntegrityError):
+        load_frames(conn, chunks, batch_size=5)
+
+    assert conn.execute("SELECT COUNT(*) FROM emissions").fetchone() == (5,)
+
+
+def test_upsert_keeps_one_row_per_ship_and_period():
+    """Testing that loading the same csv twice, then a corrected one, does not add rows"""
+    conn = sqlite3.connect(":memory:")
+    ensure_emissions_table(conn)
+    ensure_emissions_table(conn)
+
+    load_frames(conn, _chunks(100, 40), mode="upsert")
+    load_frames(conn, _chunks(100, 40), mode="upsert")
+    corrected = _chunks(10, 10)[0].assign(**{"Total CO₂ emissions [m tonnes]": 99.0})
+    stats = load_frames(conn, [corrected], mode="upsert")
+
+    assert stats["rows"] == 10
+    assert table_summary(conn) == {"table": "emissions", "rows": 100}
+    assert conn.execute(
+        "SELECT TotalCO₂Emissions FROM emissions WHERE IMONumber = 3"
+    ).fetchone() == (99.0,)
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list('emissions')")}
+    assert indexes == {"uq_emissions_ship_period", "ix_emissions_ship_type"}
+
+
+def test_upsert_needs_the_unique_key_of_an_existing_table(monkeypatch):
+    """Testing that a table created without the unique key is refused in the upsert mode, like
+    in MySQL where CREATE TABLE IF NOT EXISTS leaves an existing table as it is
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute(CREATE_TABLE)
+    monkeypatch.setitem(rds_bulk_loader.EMISSIONS_DDL, "sqlite", [])
+
+    assert not has_unique_key(conn)
+    ensure_emissions_table(conn, mode="append")
+    with pytest.raises(RuntimeError, match="uq_emissions_ship_period"):
+        ensure_emissions_table(conn, mode="upsert")
+
+    conn.execute(
+        "CREATE UNIQUE INDEX uq_emissions_ship_period ON emissions (IMONumber, ReportingPeriod)"
+    )
+    assert has_unique_key(conn)
+    ensure_emissions_table(conn, mode="upsert")
+
+
+def test_csv_is_read_in_projected_chunks(tmp_path):
+    """Testing that only the loaded columns are parsed, in chunks, with numeric measures"""
+    path = tmp_path / "2021.csv"
+    df = pd.concat(_chunks(25, 25)).astype({"Total CO₂ emissions [m tonnes]": object})
+    df.loc[4, "Total CO₂ emissions [m tonnes]"] = "Division by zero!"
+    df.to_csv(path, index=False)
+
+    chunks = list(read_csv_chunks(str(path), chunksize=10))
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert "Name" not in chunks[0].columns
+    assert chunks[0]["Reporting Period"].dtype == np.int16
+    assert pd.isna(chunks[0]["Total CO₂ emissions [m tonnes]"].iloc[4])
+    assert chunks[2]["Total CO₂ emissions [m tonnes]"].iloc[-1] == 36.0
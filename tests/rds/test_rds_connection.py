@@ -0,0 +1,77 @@
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append("src")
+import lambda_function_s3_to_RDS  # noqa: E402
+import rds_connection  # noqa: E402
+from rds_connection import ConnectionManager  # noqa: E402
+
+
+class _DroppedConnection:
+    """A connection whose server went away while the container was idle"""
+
+    def __init__(self):
+        self.closed = False
+
+    def ping(self, reconnect=True):
+        raise ConnectionError("MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_is_opened_lazily_and_reused():
+    """Testing that the connection is only opened on first use and reused while it is alive"""
+    opened = []
+
+    def connect():
+        opened.append(sqlite3.connect(":memory:"))
+        return opened[-1]
+
+    manager = ConnectionManager(connect)
+    assert opened == []
+
+    conn = manager.connection()
+    assert manager.connection() is conn
+    assert len(opened) == 1
+
+
+def test_dropped_connection_is_opened_again():
+    """Testing that a connection failing the health check is replaced by a new one"""
+    dropped = _DroppedConnection()
+    connections = [dropped, sqlite3.connect(":memory:")]
+    manager = ConnectionManager(lambda: connections.pop(0))
+
+    assert manager.connection() is dropped
+    conn = manager.connection()
+
+    assert conn is not dropped
+    assert dropped.closed
+    assert conn.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_proxy_endpoint_and_timeouts_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("RDS_HOST", "emissions.rds.amazonaws.com")
+    monkeypatch.setenv("RDS_PROXY_HOST", "emissions.proxy-rds.amazonaws.com")
+    monkeypatch.setenv("RDS_READ_TIMEOUT", "30")
+
+    settings = rds_connection.connection_settings()
+
+    assert settings["host"] == "emissions.proxy-rds.amazonaws.com"
+    assert settings["read_timeout"] == 30
+    assert settings["connect_timeout"] == 5
+
+
+@pytest.mark.parametrize("event", [{}, {"Records": []}, {"Records": [{"s3": {}}]}])
+def test_invalid_event_does_not_connect(monkeypatch, event):
+    """Testing that an event that fails validation never opens a connection"""
+
+    def connect():
+        raise AssertionError("connected")
+
+    monkeypatch.setattr(lambda_function_s3_to_RDS, "database", ConnectionManager(connect))
+
+    with pytest.raises(ValueError):
+        lambda_function_s3_to_RDS.lambda_handler(event, None)